@@ -0,0 +1,52 @@
+# -*- coding: utf-8 -*-
+
+"""Compare the python and numpy engines of TemporalSummarizationEngine.get_chunk.
+Their chunks are checked equal in tests/test_get_chunk.py.
+
+Usage: python benchmarks/bench_get_chunk.py [n_docs ...]
+"""
+import sys
+import time
+import random
+from datetime import datetime, timedelta
+from collections import namedtuple
+
+from contamehistorias.engine import TemporalSummarizationEngine, ProcessedHeadline
+
+Info = namedtuple('Info', ['datetime'])
+
+def synthetic_resultset(n_docs, seed=42, days=720):
+	rnd = random.Random(seed)
+	start = datetime(2016, 1, 1)
+	# a few bursts of news over a flat background
+	bursts = [ rnd.uniform(0, days) for _ in range(8) ]
+	times = []
+	for _ in range(n_docs):
+		if rnd.random() < 0.7:
+			offset = rnd.gauss(rnd.choice(bursts), days / 60.)
+		else:
+			offset = rnd.uniform(0, days)
+		times.append(start + timedelta(days=min(max(offset, 0), days)))
+	times.sort()
+	return [ ProcessedHeadline(info=Info(datetime=t), candidates=[], terms={}) for t in times ]
+
+def timeit(func, repeat=3):
+	best = None
+	for _ in range(repeat):
+		start = time.perf_counter()
+		result = func()
+		elapsed = time.perf_counter() - start
+		best = elapsed if best is None else min(best, elapsed)
+	return best, result
+
+def main(sizes):
+	engine = TemporalSummarizationEngine()
+	print('%10s %12s %12s %8s' % ('n_docs', 'python (s)', 'numpy (s)', 'speedup'))
+	for n_docs in sizes:
+		resultset = synthetic_resultset(n_docs)
+		t_python, _ = timeit(lambda: engine.get_chunk(resultset, engine='python'))
+		t_numpy, _ = timeit(lambda: engine.get_chunk(resultset, engine='numpy'))
+		print('%10d %12.4f %12.4f %7.1fx' % (n_docs, t_python, t_numpy, t_python / t_numpy))
+
+if __name__ == '__main__':
+	main([ int(n) for n in sys.argv[1:] ] or [1000, 10000, 50000])
@@ -0,0 +1,50 @@
+# -*- coding: utf-8 -*-
+
+"""Measure the import time of the module behind each console entry point, and fail when one is over budget.
+
+Usage: python benchmarks/bench_import.py [budget_seconds]
+"""
+import sys
+import subprocess
+import time
+
+# console_scripts of setup.py, the budget applies to importing their module in a fresh interpreter
+ENTRY_POINTS = {
+	'contamehistorias': 'contamehistorias.cli_arquivopt',
+	'contamehistorias_arquivopt': 'contamehistorias.cli_arquivopt',
+	'contamehistorias_signal': 'contamehistorias.cli_signal',
+	'contamehistorias_mediacloud': 'contamehistorias.cli_mediacloud',
+}
+
+def import_time(module, repeat=3):
+	'''best wall time of a fresh interpreter importing module, minus the time of an empty interpreter'''
+	def run(code):
+		best = None
+		for _ in range(repeat):
+			start = time.perf_counter()
+			subprocess.run([sys.executable, '-c', code], check=True)
+			elapsed = time.perf_counter() - start
+			best = elapsed if best is None else min(best, elapsed)
+		return best
+	return run('import ' + module) - run('pass')
+
+def main(budget):
+	print('%-30s %-35s %10s' % ('entry point', 'module', 'import (s)'))
+	over_budget = []
+	for entry_point, module in sorted(ENTRY_POINTS.items()):
+		try:
+			elapsed = import_time(module)
+		except subprocess.CalledProcessError:
+			print('%-30s %-35s %10s' % (entry_point, module, 'failed'))
+			over_budget.append(entry_point)
+			continue
+		print('%-30s %-35s %10.3f' % (entry_point, module, elapsed))
+		if elapsed > budget:
+			over_budget.append(entry_point)
+
+	if over_budget:
+		print('over the %.2fs budget: %s' % (budget, ', '.join(over_budget)))
+		sys.exit(1)
+
+if __name__ == '__main__':
+	main(float(sys.argv[1]) if len(sys.argv) > 1 else 1.0)
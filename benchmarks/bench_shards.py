@@ -0,0 +1,81 @@
+# -*- coding: utf-8 -*-
+
+"""Compare serial and sharded DataCore ingestion in TemporalSummarizationEngine.add_headlines.
+
+The sharded runs build one DataCore per shard in process workers, send it back pickled to the parent
+and merge the shards in order. The last columns split that work, run serially: the slowest shard
+build, the pickling round trip of all shards and their merge. With enough cores the process executor
+takes about build + transfer + merge. Threads are not measured: tokenization holds the GIL, so thread
+executors ingest serially. On 4 cores sharding breaks even at about 5000 documents, see
+TemporalSummarizationEngine.MIN_PARALLEL_INGEST_DOCS, which is lowered here to shard every size.
+
+Usage: python benchmarks/bench_shards.py [n_docs ...]
+"""
+import sys
+import time
+import pickle
+import random
+from datetime import datetime, timedelta
+
+from contamehistorias.engine import TemporalSummarizationEngine, build_datacore_shard
+from contamehistorias.datacore import DataCore, TokenizationCache, get_stopword_set
+from contamehistorias.datasources.models import ResultHeadLine
+
+WORDS = ('presidente governo dilma rousseff lula silva brasil ministro senado impeachment câmara deputados aprova '
+	'destituição processo comissão especial partido oposição milhares pessoas rua protesto contra justiça supremo '
+	'tribunal juiz escutas vídeo facebook apoio crise economia eleições votação Temer PMDB PT 2016 dia').split()
+STOP = 'de da do a o em para com que no na os as e'.split()
+
+def synthetic_resultset(n_docs, seed=42, days=720):
+	rnd = random.Random(seed)
+	start = datetime(2016, 1, 1)
+	resultset = []
+	for i in range(n_docs):
+		# a distinct number per headline keeps the vocabulary growing as in real news
+		words = [ rnd.choice(STOP) if rnd.random() < 0.25 else rnd.choice(WORDS) for _ in range(rnd.randint(4, 12)) ] + [ str(rnd.randint(0, n_docs)) ]
+		resultset.append(ResultHeadLine(headline=' '.join(words), datetime=start + timedelta(days=rnd.uniform(0, days)), domain='d.pt', url='http://x/%d' % i))
+	return resultset
+
+def ingest(engine, resultset):
+	'''seconds to add resultset to a new DataCore, and the DataCore'''
+	# a cold tokenization cache, so the serial run does not tokenize for the sharded ones
+	TemporalSummarizationEngine.TOKENIZATION_CACHE = TokenizationCache()
+	dc = DataCore(windows_size=engine.windows_size, stopword_set=get_stopword_set('pt'), cooccurrence=engine.cooccurrence, tokenization_cache=TemporalSummarizationEngine.TOKENIZATION_CACHE)
+	start = time.perf_counter()
+	engine.add_headlines(dc, resultset, {})
+	return time.perf_counter() - start, dc
+
+def shard_costs(resultset, n_jobs, cooccurrence='graph'):
+	'''seconds of the slowest shard build, of pickling and unpickling every shard and of merging them'''
+	texts = [ result.headline for result in resultset ]
+	shard_size = -(-len(texts) // n_jobs)
+	build = 0.
+	shards = []
+	for i in range(0, len(texts), shard_size):
+		start = time.perf_counter()
+		shards.append(build_datacore_shard(texts[i:i+shard_size], get_stopword_set('pt'), 2, cooccurrence))
+		build = max(build, time.perf_counter() - start)
+
+	start = time.perf_counter()
+	shards = [ pickle.loads(pickle.dumps(shard)) for shard in shards ]
+	transfer = time.perf_counter() - start
+
+	dc = DataCore(windows_size=2, stopword_set=get_stopword_set('pt'), cooccurrence=cooccurrence)
+	start = time.perf_counter()
+	for shard_dc, _ in shards:
+		dc.merge(shard_dc)
+	return build, transfer, time.perf_counter() - start
+
+def main(sizes, n_jobs=4):
+	print('%d shards' % n_jobs)
+	TemporalSummarizationEngine.MIN_PARALLEL_INGEST_DOCS = 0
+	print('%10s %12s %12s %12s %12s %12s' % ('n_docs', 'serial (s)', 'process (s)', 'build (s)', 'transfer (s)', 'merge (s)'))
+	for n_docs in sizes:
+		resultset = synthetic_resultset(n_docs)
+		t_serial, dc_serial = ingest(TemporalSummarizationEngine(executor='serial'), resultset)
+		t_process, dc = ingest(TemporalSummarizationEngine(executor='process', n_jobs=n_jobs), resultset)
+		assert [ (t, w.tf) for t, w in dc.terms.items() ] == [ (t, w.tf) for t, w in dc_serial.terms.items() ], 'sharded DataCore differs for n_docs=%d' % n_docs
+		print('%10d %12.3f %12.3f %12.3f %12.3f %12.3f' % ((n_docs, t_serial, t_process) + shard_costs(resultset, n_jobs)))
+
+if __name__ == '__main__':
+	main([ int(n) for n in sys.argv[1:] ] or [5000, 20000, 50000])
@@ -14,7 +14,82 @@ class Levenshtein(object):
         return Levenshtein.__ratio(str_distance,str_length)
 
     @staticmethod
-    def distance(seq1, seq2):  
+    def ratio_many(seq, candidates):
+        '''ratio between seq and every sequence in candidates, reusing the bit masks of seq'''
+        try:
+            peq = Levenshtein.__pattern_masks(seq)
+        except TypeError:
+            return [ Levenshtein.__ratio(Levenshtein.distance_matrix(seq, cand), max(len(seq), len(cand))) for cand in candidates ]
+        return [ Levenshtein.__ratio(Levenshtein.__bit_parallel_distance(peq, len(seq), cand), max(len(seq), len(cand))) for cand in candidates ]
+
+    @staticmethod
+    def distance(seq1, seq2):
+        try:
+            peq = Levenshtein.__pattern_masks(seq1)
+        except TypeError:
+            # unhashable items can not index the bit masks
+            return Levenshtein.distance_matrix(seq1, seq2)
+        return float(Levenshtein.__bit_parallel_distance(peq, len(seq1), seq2))
+
+    @staticmethod
+    def bounded_distance(seq1, seq2, max_distance):
+        '''distance between seq1 and seq2, or None as soon as it is known to exceed max_distance'''
+        if abs(len(seq1) - len(seq2)) > max_distance:
+            return None
+        try:
+            peq = Levenshtein.__pattern_masks(seq1)
+        except TypeError:
+            str_distance = Levenshtein.distance_matrix(seq1, seq2)
+            return str_distance if str_distance <= max_distance else None
+        str_distance = Levenshtein.__bit_parallel_distance(peq, len(seq1), seq2, max_distance)
+        return None if str_distance is None else float(str_distance)
+
+    @staticmethod
+    def __pattern_masks(seq):
+        peq = {}
+        for i, c in enumerate(seq):
+            peq[c] = peq.get(c, 0) | (1 << i)
+        return peq
+
+    @staticmethod
+    def __bit_parallel_distance(peq, m, seq2, max_distance=None):
+        '''Myers/Hyyrö bit-parallel edit distance, one Python int holds a whole column of the DP matrix.
+        With max_distance, returns None once the last row can no longer come back under it'''
+        if m == 0:
+            return len(seq2) if max_distance is None or len(seq2) <= max_distance else None
+
+        mask = (1 << m) - 1
+        last = 1 << (m - 1)
+        pv = mask
+        mv = 0
+        score = m
+
+        # each remaining character of seq2 lowers the last row by at most one
+        remaining = len(seq2)
+
+        for c in seq2:
+            remaining -= 1
+            eq = peq.get(c, 0)
+            xv = eq | mv
+            xh = ((((eq & pv) + pv) & mask) ^ pv) | eq
+            ph = mv | (~(xh | pv) & mask)
+            mh = pv & xh
+            if ph & last:
+                score += 1
+            elif mh & last:
+                score -= 1
+            ph = ((ph << 1) | 1) & mask
+            mh = (mh << 1) & mask
+            pv = mh | (~(xv | ph) & mask)
+            mv = ph & xv
+            if max_distance is not None and score - remaining > max_distance:
+                return None
+
+        return score
+
+    @staticmethod
+    def distance_matrix(seq1, seq2):
+        '''reference dynamic programming implementation'''
         size_x = len(seq1) + 1
         size_y = len(seq2) + 1
         matrix = np.zeros ((size_x, size_y))
@@ -0,0 +1,111 @@
+# -*- coding: utf-8 -*-
+
+from .datacore import DataCore
+import numpy as np
+import hashlib
+import json
+
+
+class BackgroundStatistics(object):
+    '''term counts and co-occurrence degrees of a large collection, built once and kept on disk.
+
+    A DataCore seeded with it adds these counts to the ones of its own documents when computing the term
+    features, and takes avgTF, stdTF and maxTF over the union of both. Only the terms of the query documents
+    are looked up, so the per-query cost does not grow with the background. Build it with the same stop words
+    as the DataCore it seeds.
+
+    Co-occurrence weights add up exactly, but the degrees, counts of distinct neighbours, are only known per
+    collection and are summed too: a neighbour a term has in both counts twice. The degree-based features
+    (PWL, PWR and so WRel) are therefore an approximation, exact when the two neighbour sets are disjoint and
+    overestimated otherwise.'''
+
+    FORMAT_VERSION = 1
+    COLUMNS = ('tf', 'tf_a', 'tf_n', 'out_degree', 'out_weight', 'in_degree', 'in_weight')
+
+    def __init__(self, terms, stopword, tf, tf_a, tf_n, out_degree, out_weight, in_degree, in_weight, number_of_documents=0):
+        self.terms = list(terms)
+        self.index = dict([ (term, i) for i, term in enumerate(self.terms) ])
+        self.stopword = np.asarray(stopword, dtype=np.bool_)
+        self.number_of_documents = number_of_documents
+        for (name, values) in zip(BackgroundStatistics.COLUMNS, (tf, tf_a, tf_n, out_degree, out_weight, in_degree, in_weight)):
+            setattr(self, name, np.asarray(values, dtype=np.float64))
+
+        valid_tf = self.tf[~self.stopword]
+        self.n_valid = len(valid_tf)
+        self.sum_tf = valid_tf.sum()
+        self.sum_sq_tf = (valid_tf ** 2).sum()
+        self.max_tf = self.tf.max() if len(self.tf) > 0 else 0.
+        self._fingerprint = None
+
+    def __len__(self):
+        return len(self.terms)
+
+    def fingerprint(self):
+        '''hash of the terms and counts, identifies the background in the keys of a ResultCache'''
+        if self._fingerprint is None:
+            digest = hashlib.sha256()
+            digest.update(json.dumps([BackgroundStatistics.FORMAT_VERSION, self.terms, self.number_of_documents]).encode('utf-8'))
+            digest.update(self.stopword.tobytes())
+            for name in BackgroundStatistics.COLUMNS:
+                digest.update(getattr(self, name).tobytes())
+            self._fingerprint = digest.hexdigest()
+        return self._fingerprint
+
+    @staticmethod
+    def from_datacore(dc):
+        table = dc.term_table
+        n = table.size
+        out_degree, out_weight, in_degree, in_weight = dc.G.degrees()
+        return BackgroundStatistics(dc.terms.keys(), table.stopword[:n], table.tf[:n], table.tf_a[:n], table.tf_n[:n],
+            out_degree[:n], out_weight[:n], in_degree[:n], in_weight[:n], number_of_documents=dc.number_of_documents)
+
+    @staticmethod
+    def build(texts, stopword_set, windows_size=2, cooccurrence='sparse'):
+        '''statistics of texts, e.g. the headlines of an archive slice'''
+        dc = DataCore(stopword_set=stopword_set, windows_size=windows_size, cooccurrence=cooccurrence)
+        for text in texts:
+            dc.add_document(text)
+        return BackgroundStatistics.from_datacore(dc)
+
+    def seed(self, term_obj):
+        '''copy the background counts of a new term of a DataCore into its TermTable row'''
+        i = self.index.get(term_obj.unique_term)
+        if i is None:
+            return
+        table, row = term_obj.table, term_obj.row
+        table.background_seen[row] = True
+        for name in BackgroundStatistics.COLUMNS:
+            getattr(table, 'background_' + name)[row] = getattr(self, name)[i]
+
+    def normalizers(self, table):
+        '''(avgTF, stdTF, maxTF) of the background and the terms of table together'''
+        n = table.size
+        tf = table.tf[:n]
+        background_tf = table.background_tf[:n]
+        valid = ~table.stopword[:n]
+
+        n_valid = self.n_valid + np.count_nonzero(valid & ~table.background_seen[:n])
+        sum_tf = self.sum_tf + tf[valid].sum()
+        sum_sq_tf = self.sum_sq_tf + ((tf + background_tf) ** 2 - background_tf ** 2)[valid].sum()
+        with np.errstate(divide='ignore', invalid='ignore'):
+            avgTF = np.float64(sum_tf) / n_valid
+            stdTF = np.sqrt(max(np.float64(sum_sq_tf) / n_valid - avgTF ** 2, 0.))
+
+        maxTF = max(self.max_tf, (tf + background_tf).max() if n > 0 else 0.)
+        if maxTF == 0:
+            maxTF = 1.
+        return avgTF, stdTF, maxTF
+
+    def save(self, path):
+        meta = {'version': BackgroundStatistics.FORMAT_VERSION, 'terms': self.terms, 'number_of_documents': self.number_of_documents}
+        with open(path, 'wb') as fp:
+            np.savez(fp, meta=np.array(json.dumps(meta)), stopword=self.stopword, **dict([ (name, getattr(self, name)) for name in BackgroundStatistics.COLUMNS ]))
+
+    @staticmethod
+    def load(path):
+        with np.load(path) as data:
+            meta = json.loads(str(data['meta']))
+            if meta['version'] != BackgroundStatistics.FORMAT_VERSION:
+                raise ValueError('Unsupported BackgroundStatistics format version: ' + str(meta['version']))
+            return BackgroundStatistics(meta['terms'], data['stopword'], *[ data[name] for name in BackgroundStatistics.COLUMNS ],
+                number_of_documents=meta['number_of_documents'])
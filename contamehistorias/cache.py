@@ -0,0 +1,153 @@
+# -*- coding: utf-8 -*-
+
+from datetime import datetime
+import hashlib
+import gzip
+import json
+import os
+import tempfile
+import threading
+
+
+class DiskCache(object):
+	'''Gzipped JSON files in a directory, one per key, evicted least recently used first.
+
+	Writes go through a temporary file and an atomic rename, touch refreshes the modification time of an
+	entry. The size of the directory is scanned once and then counted in memory as entries are written;
+	once it exceeds max_size the directory is scanned again and the oldest entries are removed down to
+	EVICT_TO of max_size, so the following writes do not scan it again. Several threads and processes
+	can share a directory: each counts its own writes, and entries removed by another one are skipped.'''
+
+	EXTENSION = '.json.gz'
+	EVICT_TO = 0.9
+
+	def __init__(self, directory, max_size):
+		self.directory = directory
+		self.max_size = max_size
+		self.hits = 0
+		self.misses = 0
+		self.evictions = 0
+		self.lock = threading.Lock()
+
+		os.makedirs(directory, exist_ok=True)
+		self.size = sum([ size for _, size, _ in self.entries() ])
+
+	def path(self, key):
+		return os.path.join(self.directory, key + DiskCache.EXTENSION)
+
+	def read(self, key):
+		'''value stored under key, or None'''
+		try:
+			with gzip.open(self.path(key), 'rt', encoding='utf-8') as fp:
+				return json.load(fp)
+		except (OSError, ValueError):
+			return None
+
+	def touch(self, key):
+		try:
+			os.utime(self.path(key), None)
+		except OSError:
+			pass
+
+	def write(self, key, value):
+		'''store the JSON serializable value under key, returns its JSON text'''
+		text = json.dumps(value)
+
+		fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+		with os.fdopen(fd, 'wb') as raw, gzip.GzipFile(fileobj=raw, mode='wb') as fp:
+			fp.write(text.encode('utf-8'))
+		size = os.path.getsize(tmp_path)
+		try:
+			replaced_size = os.path.getsize(self.path(key))
+		except OSError:
+			replaced_size = 0
+		os.replace(tmp_path, self.path(key))
+
+		with self.lock:
+			self.size += size - replaced_size
+			full = self.size > self.max_size
+		if full:
+			self.evict()
+		return text
+
+	def entries(self):
+		'''(modification time, size, file name) of every entry in the directory'''
+		entries = []
+		for name in os.listdir(self.directory):
+			if name.endswith(DiskCache.EXTENSION):
+				try:
+					stat = os.stat(os.path.join(self.directory, name))
+				except OSError:
+					continue
+				entries.append((stat.st_mtime, stat.st_size, name))
+		return entries
+
+	def evict(self):
+		with self.lock:
+			entries = self.entries()
+			total_size = sum([ size for _, size, _ in entries ])
+			for _, size, name in sorted(entries):
+				if total_size <= self.max_size * DiskCache.EVICT_TO:
+					break
+				try:
+					os.remove(os.path.join(self.directory, name))
+				except OSError:
+					pass
+				total_size -= size
+				self.evictions += 1
+			self.size = total_size
+
+	def clear(self):
+		with self.lock:
+			for name in os.listdir(self.directory):
+				if name.endswith(DiskCache.EXTENSION):
+					try:
+						os.remove(os.path.join(self.directory, name))
+					except OSError:
+						pass
+			self.size = 0
+
+	def stats(self):
+		return {'hits': self.hits, 'misses': self.misses, 'evictions': self.evictions}
+
+
+class ResultCache(DiskCache):
+	'''Content-addressed on-disk cache of serialized build_intervals results.
+
+	Entries are named by the hash of the input headlines and the summarization parameters, see DiskCache
+	for the storage and the eviction.'''
+
+	def __init__(self, directory=os.path.join(os.path.expanduser('~'), '.cache', 'contamehistorias', 'results'), max_size=512*1024*1024):
+		DiskCache.__init__(self, directory, max_size)
+
+	@staticmethod
+	def key(resultset, **params):
+		'''hash of the headlines, in their order, and of the summarization parameters.
+		Datetimes are hashed in full, down to the microsecond and with their time zone'''
+		digest = hashlib.sha256()
+		digest.update(json.dumps(params, sort_keys=True).encode('utf-8'))
+		for hl in resultset:
+			digest.update(json.dumps(hl.__dict__, default=ResultCache.encode_value, sort_keys=True).encode('utf-8'))
+			digest.update(b'\n')
+		return digest.hexdigest()
+
+	@staticmethod
+	def encode_value(value):
+		if isinstance(value, datetime):
+			return value.isoformat()
+		raise TypeError('Object of type %s is not JSON serializable' % type(value).__name__)
+
+	def get(self, key):
+		'''cached value of key, or None'''
+		value = self.read(key)
+		if value is None:
+			self.misses += 1
+			return None
+
+		self.touch(key)
+		self.hits += 1
+		return value
+
+	def put(self, key, value):
+		'''store the JSON serializable value under key, returns it as it will be read back'''
+		return json.loads(self.write(key, value))
@@ -1,35 +1,153 @@
 # -*- coding: utf-8 -*-
 
-from segtok.segmenter import split_multi
-from segtok.tokenizer import web_tokenizer, split_contractions
-
-import networkx as nx
+from collections import OrderedDict
+from functools import lru_cache
+from array import array
+import threading
 import numpy as np
-import pandas as pd 
 import string
 import os
 import math
-import jellyfish
 import re
 import json
 
+@lru_cache(maxsize=None)
+def get_stopword_set(lan):
+    '''frozenset of the stop words of a language, loaded once per process'''
+    from stop_words import get_stop_words
+    return frozenset(get_stop_words(lan))
+
 class DataCore(object):
+    COOCCURRENCE_BACKENDS = ('graph', 'sparse')
+    # version of the save/load format
+    FORMAT_VERSION = 1
+    PRE_FILTER = re.compile("^(\\s*([A-Z]))")
     
-    def __init__(self, stopword_set, windows_size, tagsToDiscard = set(['u', 'd']), exclude = set(string.punctuation)):
+    def __init__(self, stopword_set, windows_size, tagsToDiscard = set(['u', 'd']), exclude = set(string.punctuation), cooccurrence='graph', tokenization_cache=None, background=None):
         self.number_of_documents = 0
         self.number_of_sentences = 0
         self.number_of_words = 0
         self.terms = {}
         self.term_vector = []
+        # features of the terms in self.terms, one row per term id
+        self.term_table = TermTable()
         self.candidates = {}
         self.freq_ns = {}
+        # terms whose occurrences or edges changed since the last build_single_terms_features
+        self.updated_terms = set()
         
-        self.G = nx.DiGraph()
+        # co-occurrence counts: a networkx DiGraph ('graph') or SciPy sparse matrices ('sparse')
+        if cooccurrence == 'graph':
+            self.G = CooccurrenceGraph()
+        elif cooccurrence == 'sparse':
+            self.G = CooccurrenceMatrix()
+        else:
+            raise ValueError('Unknown cooccurrence backend: ' + str(cooccurrence))
+        self.cooccurrence = cooccurrence
 
         self.windowsSize = windows_size
         self.exclude = exclude
         self.tagsToDiscard = tagsToDiscard
         self.stopword_set = stopword_set
+        # raw token -> (tag, with "n" regardless of the position, lowercase form, stopword status)
+        self.words = {}
+        self.exclude_table = str.maketrans('', '', ''.join(exclude))
+
+        # pass the same TokenizationCache to several DataCore to share the tokenizations
+        if tokenization_cache is None:
+            tokenization_cache = TokenizationCache()
+        self.tokenization_cache = tokenization_cache
+
+        # background.BackgroundStatistics whose counts are added to the ones of the documents of this DataCore
+        self.background = background
+
+    def __getstate__(self):
+        # the tokenization cache and the interned words are caches, possibly shared, and not worth sending to other processes
+        state = dict(self.__dict__)
+        state['tokenization_cache'] = None
+        state['words'] = {}
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.tokenization_cache = TokenizationCache()
+
+    def save(self, path):
+        '''write the vocabulary, term features, occurrences, co-occurrence counts and candidates to an uncompressed .npz.
+        Terms that get_term did not save are left out'''
+        table = self.term_table
+        occurrences = table.occurrences
+        adjacency = self.G.adjacency().tocoo()
+        candidates = list(self.candidates.values())
+
+        meta = {
+            'version': DataCore.FORMAT_VERSION,
+            'number_of_documents': self.number_of_documents,
+            'number_of_sentences': self.number_of_sentences,
+            'number_of_words': self.number_of_words,
+            'windows_size': self.windowsSize,
+            'tags_to_discard': sorted(self.tagsToDiscard),
+            'exclude': sorted(self.exclude),
+            'stopword_set': sorted(self.stopword_set),
+            'cooccurrence': self.cooccurrence,
+            'terms': list(self.terms.keys()),
+            'candidates': [ (cand.unique_kw, cand.kw, sorted(cand.tags)) for cand in candidates ],
+        }
+        arrays = dict([ ('term_' + name, getattr(table, name)[:table.size]) for (name, _, _) in TermTable.COLUMNS ])
+        arrays.update([ ('occurrence_' + name, occurrences.column(name)) for name in OccurrenceLog.COLUMNS ])
+        with open(path, 'wb') as fp:
+            np.savez(fp, meta=np.array(json.dumps(meta)),
+                updated_terms=np.array([ term_obj.row for term_obj in self.updated_terms if term_obj.table is table ], dtype=np.int64),
+                cooccurrence_row=adjacency.row, cooccurrence_col=adjacency.col, cooccurrence_count=adjacency.data,
+                candidate_size=np.array([ cand.size for cand in candidates ], dtype=np.int64),
+                candidate_tf=np.array([ cand.tf for cand in candidates ], dtype=np.float64),
+                candidate_integrity=np.array([ cand.integrity for cand in candidates ], dtype=np.float64),
+                candidate_H=np.array([ cand.H for cand in candidates ], dtype=np.float64),
+                candidate_stopwords=np.array([ cand.start_or_end_stopwords for cand in candidates ], dtype=np.bool_),
+                candidate_ptr=np.concatenate([ [0], np.cumsum([ len(cand.terms) for cand in candidates ]) ]).astype(np.int64),
+                candidate_terms=np.array([ term_obj.row for cand in candidates for term_obj in cand.terms ], dtype=np.int64),
+                **arrays)
+
+    @staticmethod
+    def load(path, tokenization_cache=None, background=None):
+        '''DataCore written by save. The background is not saved, pass the one it was built with'''
+        with np.load(path) as data:
+            meta = json.loads(str(data['meta']))
+            if meta['version'] != DataCore.FORMAT_VERSION:
+                raise ValueError('Unsupported DataCore format version: ' + str(meta['version']))
+
+            dc = DataCore(set(meta['stopword_set']), meta['windows_size'], tagsToDiscard=set(meta['tags_to_discard']), exclude=set(meta['exclude']),
+                cooccurrence=meta['cooccurrence'], tokenization_cache=tokenization_cache, background=background)
+            dc.number_of_documents = meta['number_of_documents']
+            dc.number_of_sentences = meta['number_of_sentences']
+            dc.number_of_words = meta['number_of_words']
+
+            term_vector = [ dc.add_term(unique_term, False) for unique_term in meta['terms'] ]
+            table = dc.term_table
+            for (name, _, _) in TermTable.COLUMNS:
+                getattr(table, name)[:table.size] = data['term_' + name]
+            table.occurrences.extend(*[ data['occurrence_' + name] for name in OccurrenceLog.COLUMNS ])
+            dc.updated_terms = set([ term_vector[row] for row in data['updated_terms'].tolist() ])
+
+            dc.G.add_counts(data['cooccurrence_row'], data['cooccurrence_col'], data['cooccurrence_count'])
+
+            ptr = data['candidate_ptr'].tolist()
+            candidate_terms = data['candidate_terms'].tolist()
+            columns = zip(meta['candidates'], data['candidate_size'].tolist(), data['candidate_tf'].tolist(), data['candidate_integrity'].tolist(),
+                data['candidate_H'].tolist(), data['candidate_stopwords'].tolist())
+            for i, ((unique_kw, kw, tags), size, tf, integrity, H, start_or_end_stopwords) in enumerate(columns):
+                cand = ComposedWord(None, None)
+                cand.tags = set(tags)
+                cand.unique_kw = unique_kw
+                cand.kw = kw
+                cand.size = size
+                cand.terms = [ term_vector[row] for row in candidate_terms[ptr[i]:ptr[i+1]] ]
+                cand.tf = tf
+                cand.integrity = integrity
+                cand.H = H
+                cand.start_or_end_stopwords = start_or_end_stopwords
+                dc.candidates[unique_kw] = cand
+        return dc
 
     # Build the datacore features
     # TODO: Integrity, 
@@ -41,20 +159,17 @@ class DataCore(object):
         term_in_doc = {}
         block_of_word_obj = []
 
-        # Use a dictionary to map tokenized sentences (list of words) to original sentence
+        # Use a dictionary to map tokenized sentences (tuple of words) to original sentence
         # To avoid reconstruct the sentence from the list of tokens
         map_str_tokenized = {}
-        for s in list(split_multi(text)):
-            if len(s.strip()) > 0:
-                map_str_tokenized[json.dumps([w for w in split_contractions(web_tokenizer(s)) if not (w.startswith("'") and len(w) > 1) and len(w) > 0])] = s
+        for (tokens, s) in self.tokenization_cache.tokenize(text):
+            map_str_tokenized[tokens] = s
 
         self.number_of_sentences += len(map_str_tokenized)
 
         # For each tokenized sentence
         for (sentence_id, sentence) in enumerate(map_str_tokenized.keys()):
 
-            sentence = json.loads(sentence)
-
             block_of_word_obj = []
 
             # For each word in sentence
@@ -79,11 +194,13 @@ class DataCore(object):
             self.number_of_words += pos_text
 
             # Create candidate(s)
-            cand = ComposedWord(block_of_word_obj, map_str_tokenized[json.dumps(sentence)])
+            cand = ComposedWord(block_of_word_obj, map_str_tokenized[sentence])
             cand = self.add_or_update_composed_word(cand)
             if cand.unique_kw not in document_candidates:
                 document_candidates[cand.unique_kw] = cand
 
+        self.updated_terms.update(term_in_doc.values())
+
         return document_candidates, term_in_doc
 
     def compute_jaccard_similarity_score(self, x, y):
@@ -93,11 +210,13 @@ class DataCore(object):
             return 0.
         return intersection_cardinality / float(union_cardinality)
 
-    def add_bias(self, query):
-        sentences_str = [ [w for w in split_contractions(web_tokenizer(s)) if not (w.startswith("'") and len(w) > 1) and len(w) > 0] for s in list(split_multi(query)) if len(s.strip()) > 0]
+    def add_bias(self, query, updated_only=False, engine='numpy'):
+        '''weight terms by their document and context overlap with the query terms.
+        With updated_only, only terms in updated_terms are rescored, unless a query term was updated.
+        engine='numpy' computes every Jaccard score with sparse products, engine='python' one pair at a time'''
+        sentences_str = [ tokens for (tokens, _) in self.tokenization_cache.tokenize(query) ]
 
         query_objs = {}
-        flatten = lambda l: [item for sublist in l for item in sublist]
 
         for (sentence_id, sentence) in enumerate(sentences_str):
             for (pos_sent, word) in enumerate(sentence):
@@ -106,42 +225,158 @@ class DataCore(object):
                     if tag not in self.tagsToDiscard:
                         term_obj = self.get_term(word)
                         if not term_obj.stopword and term_obj.unique_term not in query_objs:
-                            query_objs[term_obj.unique_term] = (term_obj, flatten([[ out_v for (in_v, out_v) in self.G.out_edges(term_obj.id) ], [ in_v for (in_v, out_v) in self.G.in_edges(term_obj.id) ]]))
+                            query_objs[term_obj.unique_term] = (term_obj, self.G.successors(term_obj.id) + self.G.predecessors(term_obj.id))
         if len(query_objs) == 0:
             return []
-        to_mean = []
-        for term_obj in [t for t in self.term_vector if not t.stopword]:
+        to_score = self.term_vector
+        if updated_only and not any(query_term_obj in self.updated_terms for query_term_obj, _ in query_objs.values()):
+            to_score = [t for t in self.term_vector if t in self.updated_terms]
+        if engine == 'numpy':
+            self.compute_bias([t for t in to_score if not t.stopword], [ query_term_obj for query_term_obj, _ in query_objs.values() ])
+            return sorted([t for t in self.term_vector if not t.stopword], key=lambda t: t.bias)
+        elif engine != 'python':
+            raise ValueError('Unknown add_bias engine: ' + str(engine))
+        for term_obj in [t for t in to_score if not t.stopword]:
             term_occurs = term_obj.occurs.keys()
             jac = 0.
 
-            term_context = flatten([[ out_v for (in_v, out_v) in self.G.out_edges(term_obj.id) ], [ in_v for (in_v, out_v) in self.G.in_edges(term_obj.id) ]])
+            term_context = self.G.successors(term_obj.id) + self.G.predecessors(term_obj.id)
             context_jac = 0.
             
             for query_term_obj, query_term_context in query_objs.values():
                 jac += self.compute_jaccard_similarity_score(term_occurs, query_term_obj.occurs.keys())
                 context_jac += self.compute_jaccard_similarity_score(term_context, query_term_context)
             if jac == 1. or  context_jac == 1.:
-                term_obj.bias *= 0.05
+                term_obj.bias = 0.05
             else:
-                term_obj.bias *= (1.-(jac/len(query_objs)))*(1.-(context_jac/len(query_objs)))
+                term_obj.bias = (1.-(jac/len(query_objs)))*(1.-(context_jac/len(query_objs)))
         return sorted([t for t in self.term_vector if not t.stopword], key=lambda t: t.bias)
 
-    def build_single_terms_features(self, features=None):
-        validTerms = [ term for term in self.terms.values() if not term.stopword ]
-        validTFs = (np.array([ x.tf for x in validTerms ]))
-        avgTF = validTFs.mean()
-        stdTF = validTFs.std()
-        if len(self.terms.values()) == 0 or max([ x.tf for x in self.terms.values()]) == 0:
-            maxTF = 1.
+    def compute_bias(self, terms, query_terms):
+        '''add_bias scores of terms from sparse term x document and term x neighbour incidence matrices,
+        summing the Jaccard scores of each query term in the same order as the python engine'''
+        if len(terms) == 0:
+            return
+        rows = terms + query_terms
+
+        # term x document incidence, one row per scored term followed by the query terms.
+        # Terms outside term_table (not saved by get_term) never occurred and take the empty last row
+        from scipy import sparse
+        table = self.term_table
+        occurrences = table.occurrences
+        all_docs = sparse.csr_matrix((np.ones(len(occurrences)), (occurrences.column('term'), occurrences.column('doc'))), shape=(table.size + 1, self.number_of_documents + 1))
+        all_docs = (all_docs > 0).astype(np.float64).tocsr()
+        docs = all_docs[[ term_obj.row if term_obj.table is table else table.size for term_obj in rows ]]
+
+        # term x neighbour incidence, neighbours being successors or predecessors in the co-occurrence graph
+        adjacency = self.G.adjacency()
+        adjacency = ((adjacency + adjacency.T) > 0).astype(np.float64).tocsr()
+        context = adjacency[[ term_obj.id for term_obj in rows ]]
+
+        n_terms = len(terms)
+        jac = np.zeros(n_terms)
+        context_jac = np.zeros(n_terms)
+        for incidence, total in [(docs, jac), (context, context_jac)]:
+            sizes = np.diff(incidence.indptr)
+            intersections = (incidence[:n_terms] @ incidence[n_terms:].T).toarray()
+            for q in range(len(query_terms)):
+                unions = sizes[:n_terms] + sizes[n_terms + q] - intersections[:, q]
+                total += np.where(unions == 0, 0., intersections[:, q] / np.maximum(unions, 1))
+
+        n_query = len(query_terms)
+        bias = np.where((jac == 1.) | (context_jac == 1.), 0.05, (1.-(jac/n_query))*(1.-(context_jac/n_query)))
+        for term_obj, term_bias in zip(terms, bias.tolist()):
+            term_obj.bias = term_bias
+
+    def build_single_terms_features(self, features=None, updated_only=False):
+        '''compute H for every term. With updated_only, the per-term occurrence and edge statistics
+        are refreshed only for updated_terms, and H is recombined with the new corpus-wide normalizers'''
+        table = self.term_table
+        if self.background is None:
+            tf = table.tf[:table.size]
+            validTFs = tf[~table.stopword[:table.size]]
+            avgTF = validTFs.mean()
+            stdTF = validTFs.std()
+            if table.size == 0 or tf.max() == 0:
+                maxTF = 1.
+            else:
+                maxTF = tf.max()
+        else:
+            (avgTF, stdTF, maxTF) = self.background.normalizers(table)
+        if updated_only:
+            table.update_stats(self.G, rows=[ term_obj.row for term_obj in self.updated_terms if term_obj.table is table ])
         else:
-            maxTF = max([ x.tf for x in self.terms.values()])
-        list(map(lambda x: x.updateH(maxTF=maxTF, avgTF=avgTF, stdTF=stdTF, number_of_sentences=self.number_of_sentences, features=features), self.terms.values()))
+            table.update_stats(self.G)
+        table.updateH(maxTF=maxTF, avgTF=avgTF, stdTF=stdTF, number_of_sentences=self.number_of_sentences, features=features)
+        self.updated_terms = set()
+
+    def build_mult_terms_features(self, features=None, candidates=None, engine='numpy'):
+        '''compute H for every valid candidate. engine='numpy' scores them in one batch (see score_candidates),
+        engine='python' calls ComposedWord.updateH on each'''
+        if candidates is None:
+            candidates = self.candidates.values()
+        if engine == 'numpy':
+            self.score_candidates([cand for cand in candidates if cand.is_valid()], features=features)
+        elif engine == 'python':
+            list(map(lambda x: x.updateH(features=features), [cand for cand in candidates if cand.is_valid()]))
+        else:
+            raise ValueError('Unknown build_mult_terms_features engine: ' + str(engine))
+
+    def score_candidates(self, candidates, features=None):
+        '''ComposedWord.updateH of every candidate at once. The terms of the candidates are packed in a CSR layout,
+        the transition probabilities around stopwords are fetched in bulk, and sum_H/prod_H are accumulated
+        one position at a time over all the candidates, in the same order as updateH'''
+        if len(candidates) == 0:
+            return
+        table = self.term_table
+        lengths = np.array([ len(cand.terms) for cand in candidates ], dtype=np.int64)
+        rows = np.array([ term_obj.row for cand in candidates for term_obj in cand.terms ], dtype=np.int64)
+        ids = np.array([ term_obj.id for cand in candidates for term_obj in cand.terms ], dtype=np.int64)
+        starts = np.cumsum(lengths) - lengths
+
+        H = table.H[rows]
+        tf = table.tf[rows]
+        stopword = table.stopword[rows]
+        position = np.arange(len(rows)) - np.repeat(starts, lengths)
 
-    def build_mult_terms_features(self, features=None):
-        list(map(lambda x: x.updateH(features=features), [cand for cand in self.candidates.values() if cand.is_valid()]))
+        # probability of reaching a stopword from the previous term, and the next term from the stopword
+        prob_t1 = np.zeros(len(rows))
+        prob_t2 = np.zeros(len(rows))
+        with np.errstate(divide='ignore', invalid='ignore'):
+            at = np.flatnonzero(stopword & (position > 0))
+            edge_tf = self.G.weights(ids[at-1], ids[at])
+            prob_t1[at] = np.where(edge_tf > 0, edge_tf / tf[at-1], 0.)
+
+            at = np.flatnonzero(stopword & (position < np.repeat(lengths, lengths) - 1))
+            edge_tf = self.G.weights(ids[at], ids[at+1])
+            prob_t2[at] = np.where(edge_tf > 0, edge_tf / tf[at+1], 0.)
+
+        prob = prob_t1 * prob_t2
+        summands = np.where(stopword, 1 - prob, H)
+        factors = np.where(stopword, 1 + (1 - prob), H)
+
+        # candidates by decreasing length, so the ones still having a term at a position are a prefix
+        order = np.argsort(-lengths, kind='stable')
+        sorted_lengths = -lengths[order]
+        sorted_starts = starts[order]
+        sum_H = np.zeros(len(candidates))
+        prod_H = np.ones(len(candidates))
+        for t in range(-sorted_lengths[0]):
+            n_active = np.searchsorted(sorted_lengths, -t, side='left')
+            at = sorted_starts[:n_active] + t
+            sum_H[:n_active] += summands[at]
+            prod_H[:n_active] *= factors[at]
+
+        tf_used = np.ones(len(candidates))
+        if features == None or "KPF" in features:
+            tf_used = np.array([ candidates[i].tf for i in order ])
+        with np.errstate(divide='ignore', invalid='ignore'):
+            scores = prod_H / ( ( sum_H + 1 ) * tf_used )
+        for i, score in zip(order.tolist(), scores.tolist()):
+            candidates[i].H = score
 
     def pre_filter(self, text):
-        prog = re.compile("^(\\s*([A-Z]))")
+        prog = DataCore.PRE_FILTER
         parts = text.split('\n')
         buffer = ''
         for part in parts:
@@ -151,7 +386,25 @@ class DataCore(object):
             buffer += sep + part.replace('\t',' ')
         return buffer
 
+    def get_word(self, word):
+        '''interned (tag, unique_term, stopword) of a raw token, classified on its first occurrence'''
+        if word in self.words:
+            return self.words[word]
+        unique_term = word.lower()
+        # Include this part
+        simples_unique_term = unique_term.translate(self.exclude_table)
+        # until here
+        isstopword = unique_term in self.stopword_set or len(simples_unique_term) < 3
+        self.words[word] = (self.word_tag(word), unique_term, isstopword)
+        return self.words[word]
+
     def get_tag(self, word, i):
+        tag = self.get_word(word)[0]
+        if tag == "n" and i == 0:
+            return "p"
+        return tag
+
+    def word_tag(self, word):
         try:
             w2 = word.replace(",","")
             float(w2)
@@ -163,39 +416,76 @@ class DataCore(object):
                 return "u"
             if len(word) == len([c for c in word if c.isupper()]):
                 return "a"
-            if len([c for c in word if c.isupper()]) == 1 and len(word) > 1 and word[0].isupper() and i > 0:
+            if len([c for c in word if c.isupper()]) == 1 and len(word) > 1 and word[0].isupper():
                 return "n"
         return "p"
 
     def get_term(self, str_word, save_non_seen=True):
-        unique_term = str_word.lower()
-        simples_sto = unique_term in self.stopword_set
+        (_, unique_term, isstopword) = self.get_word(str_word)
         # if unique_term.endswith('s') and len(unique_term) > 3:
         #     unique_term = unique_term[:-1]
 
         if unique_term in self.terms:
             return self.terms[unique_term]
-                
-        # Include this part
-        simples_unique_term = unique_term
-        for pontuation in self.exclude:
-            simples_unique_term = simples_unique_term.replace(pontuation, '')
-        # until here
-        isstopword = simples_sto or unique_term in self.stopword_set or len(simples_unique_term) < 3
-        
+        return self.add_term(unique_term, isstopword, save_non_seen=save_non_seen)
+
+    def add_term(self, unique_term, isstopword, save_non_seen=True):
         term_id = len(self.terms)
-        term_obj = SingleWord(unique_term, term_id, self.G)
+        # terms that are not saved get a table of their own, their id is the one of the next saved term
+        term_obj = SingleWord(unique_term, term_id, self.G, table=self.term_table if save_non_seen else None)
         self.term_vector.append(term_obj)
         term_obj.stopword = isstopword
         if save_non_seen:
             self.G.add_node(term_id)
             self.terms[unique_term] = term_obj
+            self.updated_terms.add(term_obj)
+            if self.background is not None:
+                self.background.seed(term_obj)
         return term_obj
 
+    def merge(self, other):
+        '''append the documents of other, a DataCore built with the same parameters, as if they had been added
+        to this one after its own documents. Terms and candidates of other that are new here keep the order of
+        their first occurrence. The candidates of other are reused, so other should not be used afterwards'''
+        other_table = other.term_table
+
+        # other term id -> term id here
+        remap = np.empty(other_table.size, dtype=np.int64)
+        for other_term in other.terms.values():
+            if other_term.unique_term in self.terms:
+                term_obj = self.terms[other_term.unique_term]
+            else:
+                term_obj = self.add_term(other_term.unique_term, other_term.stopword)
+            self.updated_terms.add(term_obj)
+            remap[other_term.row] = term_obj.row
+
+        table = self.term_table
+        n_other = other_table.size
+        table.tf[remap] += other_table.tf[:n_other]
+        table.tf_a[remap] += other_table.tf_a[:n_other]
+        table.tf_n[remap] += other_table.tf_n[:n_other]
+
+        occurrences = other_table.occurrences
+        table.occurrences.extend(remap[occurrences.column('term')], occurrences.column('doc') + self.number_of_documents,
+            occurrences.column('sent'), occurrences.column('pos_sent'), occurrences.column('pos_text'))
+
+        adjacency = other.G.adjacency().tocoo()
+        self.G.add_counts(remap[adjacency.row], remap[adjacency.col], adjacency.data)
+
+        for (unique_kw, cand) in other.candidates.items():
+            if unique_kw in self.candidates:
+                self.candidates[unique_kw].uptade_candidate(cand)
+                self.candidates[unique_kw].tf += cand.tf
+            else:
+                cand.terms = [ self.terms[term_obj.unique_term] for term_obj in cand.terms ]
+                self.candidates[unique_kw] = cand
+
+        self.number_of_documents += other.number_of_documents
+        self.number_of_sentences += other.number_of_sentences
+        self.number_of_words += other.number_of_words
+
     def add_cooccurrence(self, left_term, right_term):
-        if right_term.id not in self.G[left_term.id]:
-            self.G.add_edge(left_term.id, right_term.id, TF=0.)
-        self.G[left_term.id][right_term.id]["TF"]+=1.
+        self.G.add(left_term.id, right_term.id)
         
     def add_or_update_composed_word(self, cand):
         if cand.unique_kw not in self.candidates:
@@ -206,6 +496,63 @@ class DataCore(object):
         return self.candidates[cand.unique_kw]
 
 
+class TokenizationCache(object):
+    '''bounded LRU cache of the segtok sentence splits of texts and of the tokens of each sentence.
+    One instance can be shared by every DataCore of a process, and by its threads: lookups and stores
+    take a lock, the tokenization itself runs outside it'''
+
+    def __init__(self, max_size=100000):
+        self.max_size = max_size
+        self.texts = OrderedDict()
+        self.sentences = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.sentence_hits = 0
+        self.sentence_misses = 0
+        self.lock = threading.Lock()
+
+    def tokenize(self, text):
+        '''tuple of (tokens, sentence) for every non empty sentence of text'''
+        with self.lock:
+            tokenized = self.texts.get(text)
+            if tokenized is not None:
+                self.hits += 1
+                self.texts.move_to_end(text)
+                return tokenized
+            self.misses += 1
+        from segtok.segmenter import split_multi
+        tokenized = tuple([ (self.tokenize_sentence(s), s) for s in split_multi(text) if len(s.strip()) > 0 ])
+        self.store(self.texts, text, tokenized)
+        return tokenized
+
+    def tokenize_sentence(self, sentence):
+        with self.lock:
+            tokens = self.sentences.get(sentence)
+            if tokens is not None:
+                self.sentence_hits += 1
+                self.sentences.move_to_end(sentence)
+                return tokens
+            self.sentence_misses += 1
+        from segtok.tokenizer import web_tokenizer, split_contractions
+        tokens = tuple([w for w in split_contractions(web_tokenizer(sentence)) if not (w.startswith("'") and len(w) > 1) and len(w) > 0])
+        self.store(self.sentences, sentence, tokens)
+        return tokens
+
+    def store(self, lru, key, value):
+        with self.lock:
+            lru[key] = value
+            if len(lru) > self.max_size:
+                lru.popitem(last=False)
+
+    def clear(self):
+        with self.lock:
+            self.texts.clear()
+            self.sentences.clear()
+
+    def stats(self):
+        return {'hits': self.hits, 'misses': self.misses, 'sentence_hits': self.sentence_hits, 'sentence_misses': self.sentence_misses, 'size': len(self.texts), 'sentence_size': len(self.sentences)}
+
+
 class ComposedWord(object):
 
     def __init__(self, terms, sentence): # [ (tag, word, term_obj) ]
@@ -250,13 +597,15 @@ class ComposedWord(object):
             if term_base.stopword:
                 prob_t1 = 0.
                 if t > 0:
-                    if term_base.G.has_edge(self.terms[t-1].id, self.terms[ t ].id):
-                        prob_t1 = term_base.G[self.terms[t-1].id][self.terms[ t ].id]["TF"] / self.terms[t-1].tf
+                    edge_tf = term_base.G.weight(self.terms[t-1].id, self.terms[ t ].id)
+                    if edge_tf > 0:
+                        prob_t1 = edge_tf / self.terms[t-1].tf
 
                 prob_t2 = 0.
                 if t < len(self.terms)-1:
-                    if term_base.G.has_edge(self.terms[ t ].id, self.terms[t+1].id):
-                        prob_t2 = term_base.G[self.terms[ t ].id][self.terms[t+1].id]["TF"] / self.terms[t+1].tf
+                    edge_tf = term_base.G.weight(self.terms[ t ].id, self.terms[t+1].id)
+                    if edge_tf > 0:
+                        prob_t2 = edge_tf / self.terms[t+1].tf
 
                 prob = prob_t1 * prob_t2
                 prod_H *= (1 + (1 - prob ) )
@@ -272,61 +621,284 @@ class ComposedWord(object):
         self.H = prod_H / ( ( sum_H + 1 ) * tf_used )
 
 
+class TermTable(object):
+    '''SingleWord features stored column-wise, one NumPy array per feature and one row per term'''
+
+    # (name, dtype, value of a new term)
+    COLUMNS = (
+        ('tf', np.float64, 0.), ('tf_a', np.float64, 0.), ('tf_n', np.float64, 0.), ('stopword', np.bool_, False),
+        ('bias', np.float64, 1.), ('pagerank', np.float64, 1.), ('PL', np.float64, 0.), ('PR', np.float64, 0.),
+        ('WRel', np.float64, 1.), ('WFreq', np.float64, 0.), ('WSpread', np.float64, 0.), ('WCase', np.float64, 0.),
+        ('WPos', np.float64, 1.), ('H', np.float64, 0.),
+        # statistics depending only on the occurrences and edges of a term, see SingleWord.update_stats
+        ('pwl', np.float64, 0.), ('pwr', np.float64, 0.), ('sentences_seen', np.float64, 0.),
+        ('median_pos', np.float64, np.nan), ('log_tf', np.float64, 0.), ('log_pos', np.float64, np.nan),
+        # counts of the term in the background statistics of the DataCore, if any
+        ('background_seen', np.bool_, False), ('background_tf', np.float64, 0.), ('background_tf_a', np.float64, 0.),
+        ('background_tf_n', np.float64, 0.), ('background_out_degree', np.float64, 0.), ('background_out_weight', np.float64, 0.),
+        ('background_in_degree', np.float64, 0.), ('background_in_weight', np.float64, 0.),
+    )
+
+    def __init__(self, capacity=1024):
+        self.size = 0
+        self.capacity = capacity
+        for (name, dtype, default) in TermTable.COLUMNS:
+            setattr(self, name, np.full(capacity, default, dtype=dtype))
+        self.occurrences = OccurrenceLog()
+
+    def __len__(self):
+        return self.size
+
+    def add(self):
+        '''row of a new term'''
+        if self.size == self.capacity:
+            self.capacity *= 2
+            for (name, dtype, default) in TermTable.COLUMNS:
+                column = np.full(self.capacity, default, dtype=dtype)
+                column[:self.size] = getattr(self, name)
+                setattr(self, name, column)
+        self.size += 1
+        return self.size - 1
+
+    def update_stats(self, graph, rows=None):
+        '''SingleWord.update_stats of the given rows (all by default) at once. Term ids are rows, as for the terms of a DataCore'''
+        if rows is None:
+            rows = np.arange(self.size)
+        rows = np.asarray(rows, dtype=np.int64)
+
+        out_degrees, out_weights, in_degrees, in_weights = graph.degrees()
+        # a neighbour also present in the background counts twice, see BackgroundStatistics
+        out_degrees = out_degrees[rows] + self.background_out_degree[rows]
+        out_weights = out_weights[rows] + self.background_out_weight[rows]
+        in_degrees = in_degrees[rows] + self.background_in_degree[rows]
+        in_weights = in_weights[rows] + self.background_in_weight[rows]
+        with np.errstate(divide='ignore', invalid='ignore'):
+            self.pwl[rows] = np.where(in_weights == 0, 0., in_degrees / in_weights)
+            self.pwr[rows] = np.where(out_weights == 0, 0., out_degrees / out_weights)
+
+        self.sentences_seen[rows], self.median_pos[rows] = self.occurrences.sentence_stats(rows)
+        # math.log rather than np.log, to keep H identical to SingleWord.updateH
+        self.log_pos[rows] = [ math.log( math.log( 3. + median_pos ) ) for median_pos in self.median_pos[rows].tolist() ]
+        tf = self.tf[rows] + self.background_tf[rows]
+        self.log_tf[rows[tf > 0.]] = [ math.log(term_tf) for term_tf in tf[tf > 0.].tolist() ]
+
+    def updateH(self, maxTF, avgTF, stdTF, number_of_sentences, features=None):
+        '''SingleWord.updateH of every row at once, from the statistics already in the table'''
+        n = self.size
+        tf = self.tf[:n] + self.background_tf[:n]
+        with np.errstate(divide='ignore', invalid='ignore'):
+            if features == None or "WRel" in features:
+                self.WRel[:n] = 1 + (self.pwl[:n] + self.pwr[:n]) * tf / maxTF
+
+            if features == None or "WFreq" in features:
+                self.WFreq[:n] = tf / (avgTF + stdTF)
+
+            if features == None or "WSpread" in features:
+                if number_of_sentences != 0:
+                    self.WSpread[:n] = self.sentences_seen[:n] / number_of_sentences
+
+            if features == None or "WCase" in features:
+                seen = tf > 0.
+                tf_a = self.tf_a[:n] + self.background_tf_a[:n]
+                tf_n = self.tf_n[:n] + self.background_tf_n[:n]
+                self.WCase[:n][seen] = np.maximum(tf_a, tf_n)[seen] / (1. + self.log_tf[:n][seen])
+
+            if features == None or "WPos" in features:
+                self.WPos[:n] = self.log_pos[:n]
+
+            WRel = self.WRel[:n]
+            self.H[:n] = self.bias[:n] * (self.WPos[:n] * WRel) / (self.WCase[:n] + (self.WFreq[:n] / WRel) + (self.WSpread[:n] / WRel))
+
+
+class OccurrenceLog(object):
+    '''append-only int32 columns (term, doc, sent, pos_sent, pos_text), one entry per occurrence of a term.
+    Occurrences are grouped by term through a stable sort and per-term offsets, rebuilt on the first read after an add'''
+
+    COLUMNS = ('term', 'doc', 'sent', 'pos_sent', 'pos_text')
+
+    def __init__(self):
+        for name in OccurrenceLog.COLUMNS:
+            setattr(self, name, array('i'))
+        self.dirty = False
+        self.order = np.zeros(0, dtype=np.int64)
+        self.offsets = np.zeros(1, dtype=np.int64)
+
+    def __len__(self):
+        return len(self.term)
+
+    def add(self, term, doc, sent, pos_sent, pos_text):
+        self.term.append(term)
+        self.doc.append(doc)
+        self.sent.append(sent)
+        self.pos_sent.append(pos_sent)
+        self.pos_text.append(pos_text)
+        self.dirty = True
+
+    def extend(self, term, doc, sent, pos_sent, pos_text):
+        '''add many occurrences, given as equal length integer arrays'''
+        for (name, values) in zip(OccurrenceLog.COLUMNS, (term, doc, sent, pos_sent, pos_text)):
+            getattr(self, name).frombytes(np.asarray(values, dtype=np.int32).tobytes())
+        self.dirty = True
+
+    def column(self, name):
+        return np.frombuffer(getattr(self, name), dtype=np.int32)
+
+    def freeze(self):
+        term = self.column('term')
+        self.order = np.argsort(term, kind='stable')
+        self.offsets = np.concatenate([ [0], np.cumsum(np.bincount(term)) ]).astype(np.int64)
+        self.dirty = False
+
+    def term_occurrences(self, term):
+        '''indices of the occurrences of term, in the order they were added'''
+        if self.dirty:
+            self.freeze()
+        if term + 1 >= len(self.offsets):
+            return self.order[:0]
+        return self.order[self.offsets[term]:self.offsets[term+1]]
+
+    def sentence_stats(self, terms):
+        '''for each of terms, the number of distinct (doc, sent) it occurs in and the median sent over them'''
+        terms = np.asarray(terms, dtype=np.int64)
+        term = self.column('term')
+        if len(terms) == 1:
+            selected = self.term_occurrences(terms[0])
+        else:
+            selected = np.isin(term, terms)
+        term, doc, sent = term[selected], self.column('doc')[selected], self.column('sent')[selected]
+
+        # one entry per distinct (term, doc, sent), sorted by term then sent
+        order = np.lexsort((sent, doc, term))
+        term, doc, sent = term[order], doc[order], sent[order]
+        distinct = np.ones(len(term), dtype=bool)
+        distinct[1:] = (term[1:] != term[:-1]) | (doc[1:] != doc[:-1]) | (sent[1:] != sent[:-1])
+        term, sent = term[distinct], sent[distinct]
+        order = np.lexsort((sent, term))
+        term, sent = term[order], sent[order].astype(np.float64)
+
+        unique_terms, starts, counts = np.unique(term, return_index=True, return_counts=True)
+        medians = (sent[starts + (counts - 1) // 2] + sent[starts + counts // 2]) / 2
+
+        positions = np.searchsorted(unique_terms, terms)
+        found = positions < len(unique_terms)
+        found[found] = unique_terms[positions[found]] == terms[found]
+        sentences_seen = np.zeros(len(terms))
+        median_pos = np.full(len(terms), np.nan)
+        sentences_seen[found] = counts[positions[found]]
+        median_pos[found] = medians[positions[found]]
+        return sentences_seen, median_pos
+
+
+def term_column(name):
+    '''property reading and writing the row of a SingleWord in a TermTable column'''
+    def get(self):
+        return getattr(self.table, name)[self.row].item()
+    def set(self, value):
+        getattr(self.table, name)[self.row] = value
+    return property(get, set)
+
+
 class SingleWord(object):
-    def __init__(self, unique, idx, graph):
+    '''a term, viewing its features in a TermTable'''
+    __slots__ = ('unique_term', 'id', 'G', 'table', 'row')
+
+    tf = term_column('tf')
+    tf_a = term_column('tf_a')
+    tf_n = term_column('tf_n')
+    stopword = term_column('stopword')
+    bias = term_column('bias')
+    pagerank = term_column('pagerank')
+    PL = term_column('PL')
+    PR = term_column('PR')
+    WRel = term_column('WRel')
+    WFreq = term_column('WFreq')
+    WSpread = term_column('WSpread') #DiffDistance
+    WCase = term_column('WCase')
+    WPos = term_column('WPos')
+    H = term_column('H')
+
+    # Statistics depending only on this term's occurrences and edges (see update_stats)
+    pwl = term_column('pwl')
+    pwr = term_column('pwr')
+    sentences_seen = term_column('sentences_seen')
+    median_pos = term_column('median_pos')
+    log_tf = term_column('log_tf')
+    log_pos = term_column('log_pos')
+
+    # Counts in the background statistics of the DataCore
+    background_tf = term_column('background_tf')
+    background_tf_a = term_column('background_tf_a')
+    background_tf_n = term_column('background_tf_n')
+
+    def __init__(self, unique, idx, graph, table=None):
         self.unique_term = unique
         self.id = idx
-        self.tf = 0.
-        self.WFreq = 0.0
-        self.WCase = 0.0
-        self.tf_a = 0.
-        self.tf_n = 0.
-        self.WRel = 1.0
-        self.PL = 0.
-        self.PR = 0.
-        self.occurs = {}
-        self.WPos = 1.0
-        self.WSpread = 0.0 #DiffDistance
-        self.H = 0.0
-        self.stopword = False
         self.G = graph
-        self.bias = 1.
+        if table is None:
+            table = TermTable(capacity=1)
+        self.table = table
+        self.row = table.add()
+
+    @property
+    def occurs(self):
+        '''{docid: {sent_id: [(pos_sent, pos_text)]}} of the occurrences of this term, rebuilt from the occurrence log'''
+        occurrences = self.table.occurrences
+        at = occurrences.term_occurrences(self.row)
+        occurs = {}
+        for (docid, sent_id, pos_sent, pos_text) in zip(*[ occurrences.column(name)[at].tolist() for name in ('doc', 'sent', 'pos_sent', 'pos_text') ]):
+            occurs.setdefault(docid, {}).setdefault(sent_id, []).append( (pos_sent, pos_text) )
+        return occurs
 
-        self.pagerank = 1.
+    def update_stats(self):
+        table, row = self.table, self.row
+        table.pwl[row] = self.PWL
+        table.pwr[row] = self.PWR
+        sentences_seen, median_pos = table.occurrences.sentence_stats([row])
+        table.sentences_seen[row] = sentences_seen[0]
+        median_pos = median_pos[0]
+        table.median_pos[row] = median_pos
+        tf = table.tf[row] + table.background_tf[row]
+        if tf > 0.:
+            table.log_tf[row] = math.log(tf)
+        table.log_pos[row] = math.log( math.log( 3. + median_pos ) )
+
+    def updateH(self, maxTF, avgTF, stdTF, number_of_sentences, features=None, refresh_stats=True):
+        if refresh_stats:
+            self.update_stats()
+        tf = self.tf + self.background_tf
 
-    def updateH(self, maxTF, avgTF, stdTF, number_of_sentences, features=None):
         if features == None or "WRel" in features:
            # self.PL = self.WDL / maxTF
            # self.PR = self.WDR / maxTF
            # self.WRel = ( (0.5 + (self.PWL * (self.tf / maxTF) + self.PL)) + (0.5 + (self.PWR * (self.tf / maxTF) + self.PR)) )
-           self.WRel = 1 + (self.PWL + self.PWR) * self.tf / maxTF
+           self.WRel = 1 + (self.pwl + self.pwr) * tf / maxTF
 
         if features == None or "WFreq" in features:
-            self.WFreq = self.tf / (avgTF + stdTF)
+            self.WFreq = tf / (avgTF + stdTF)
         
         if features == None or "WSpread" in features:
             if number_of_sentences != 0:
-                self.WSpread = sum([len(doc_occurs) for doc_occurs in self.occurs.values()]) / number_of_sentences
+                self.WSpread = self.sentences_seen / number_of_sentences
             #self.WSpread = len(self.occurs) / number_of_sentences
         
         if features == None or "WCase" in features:
-            if self.tf > 0.:
-                self.WCase = max(self.tf_a, self.tf_n) / (1. + math.log(self.tf))
+            if tf > 0.:
+                self.WCase = max(self.tf_a + self.background_tf_a, self.tf_n + self.background_tf_n) / (1. + self.log_tf)
         
         if features == None or "WPos" in features:
-            flatten = lambda l: [item for sublist in l for item in sublist]
-            self.WPos = math.log( math.log( 3. + np.median(flatten([list(doc_occur.keys()) for doc_occur in self.occurs.values()])) ) )
+            self.WPos = self.log_pos
             #self.WPos = math.log( math.log( 3. + np.median(list(self.occurs.keys())) ) )
 
         self.H = self.bias * (self.WPos * self.WRel) / (self.WCase + (self.WFreq / self.WRel) + (self.WSpread / self.WRel))
         
+    # Background degrees are added as they are, see BackgroundStatistics
     @property
     def WDR(self):
-        return len( self.G.out_edges(self.id) )
+        return self.G.out_degree(self.id) + self.table.background_out_degree[self.row].item()
 
     @property
     def WIR(self):
-        return sum( [ d['TF'] for (u,v,d) in self.G.out_edges(self.id, data=True) ] )
+        return self.G.out_weight(self.id) + self.table.background_out_weight[self.row].item()
 
     @property
     def PWR(self):
@@ -337,11 +909,11 @@ class SingleWord(object):
     
     @property
     def WDL(self):
-        return len( self.G.in_edges(self.id) )
+        return self.G.in_degree(self.id) + self.table.background_in_degree[self.row].item()
 
     @property
     def WIL(self):
-        return sum( [ d['TF'] for (u,v,d) in self.G.in_edges(self.id, data=True) ] )
+        return self.G.in_weight(self.id) + self.table.background_in_weight[self.row].item()
         
     @property
     def PWL(self):
@@ -351,13 +923,184 @@ class SingleWord(object):
         return self.WDL / wil 
 
     def add_occurrence(self, tag, sent_id, pos_sent, pos_text, docid=0):
-        if docid not in self.occurs:
-            self.occurs[docid] = {}
-        if sent_id not in self.occurs[docid]:
-            self.occurs[docid][sent_id] = []
-        self.occurs[docid][sent_id].append( (pos_sent, pos_text) )
-        self.tf += 1.
+        self.table.occurrences.add(self.row, docid, sent_id, pos_sent, pos_text)
+        self.table.tf[self.row] += 1.
         if tag == "a":
-            self.tf_a += 1.
+            self.table.tf_a[self.row] += 1.
         if tag == "n":
-            self.tf_n += 1.
+            self.table.tf_n[self.row] += 1.
+
+
+
+class CooccurrenceGraph(object):
+    '''Co-occurrence counts as the "TF" attribute of the edges of a networkx DiGraph'''
+
+    def __init__(self):
+        import networkx as nx
+        self.graph = nx.DiGraph()
+
+    def add_node(self, term_id):
+        self.graph.add_node(term_id)
+
+    def add(self, left_id, right_id):
+        if right_id not in self.graph[left_id]:
+            self.graph.add_edge(left_id, right_id, TF=0.)
+        self.graph[left_id][right_id]["TF"]+=1.
+
+    def add_counts(self, left_ids, right_ids, counts):
+        for (left_id, right_id, count) in zip(left_ids.tolist(), right_ids.tolist(), counts.tolist()):
+            if right_id not in self.graph[left_id]:
+                self.graph.add_edge(left_id, right_id, TF=0.)
+            self.graph[left_id][right_id]["TF"]+=count
+
+    def weight(self, left_id, right_id):
+        if self.graph.has_edge(left_id, right_id):
+            return self.graph[left_id][right_id]["TF"]
+        return 0.
+
+    def weights(self, left_ids, right_ids):
+        '''co-occurrence counts of the (left, right) pairs, 0 for pairs that never co-occurred'''
+        return np.array([ self.weight(left_id, right_id) for (left_id, right_id) in zip(left_ids, right_ids) ], dtype=np.float64)
+
+    def successors(self, term_id):
+        return [ out_v for (in_v, out_v) in self.graph.out_edges(term_id) ]
+
+    def predecessors(self, term_id):
+        return [ in_v for (in_v, out_v) in self.graph.in_edges(term_id) ]
+
+    def out_degree(self, term_id):
+        return len( self.graph.out_edges(term_id) )
+
+    def out_weight(self, term_id):
+        return sum( [ d['TF'] for (u,v,d) in self.graph.out_edges(term_id, data=True) ] )
+
+    def in_degree(self, term_id):
+        return len( self.graph.in_edges(term_id) )
+
+    def in_weight(self, term_id):
+        return sum( [ d['TF'] for (u,v,d) in self.graph.in_edges(term_id, data=True) ] )
+
+    def adjacency(self):
+        '''n_nodes x n_nodes CSR matrix of the co-occurrence counts'''
+        from scipy import sparse
+        n = self.graph.number_of_nodes()
+        edges = list(self.graph.edges(data='TF'))
+        return sparse.csr_matrix(([ tf for (u,v,tf) in edges ], ([ u for (u,v,tf) in edges ], [ v for (u,v,tf) in edges ])), shape=(n, n))
+
+    def degrees(self):
+        '''out degree, out weight, in degree and in weight of every node, as arrays indexed by node id'''
+        csr = self.adjacency()
+        csc = csr.tocsc()
+        return np.diff(csr.indptr), np.asarray(csr.sum(axis=1)).ravel(), np.diff(csc.indptr), np.asarray(csc.sum(axis=0)).ravel()
+
+
+class CooccurrenceMatrix(object):
+    '''Co-occurrence counts appended as COO pairs and frozen into SciPy CSR/CSC matrices on the first read.
+    Degrees and weights come from the row and column sums of the frozen matrices'''
+
+    def __init__(self):
+        from scipy import sparse
+        self.n_terms = 0
+        self.rows = array('i')
+        self.cols = array('i')
+        self.dirty = False
+
+        self.csr = sparse.csr_matrix((0, 0))
+        self.freeze()
+
+    def add_node(self, term_id):
+        self.n_terms = max(self.n_terms, term_id + 1)
+        self.dirty = True
+
+    def add(self, left_id, right_id):
+        self.rows.append(left_id)
+        self.cols.append(right_id)
+        self.dirty = True
+
+    def add_counts(self, left_ids, right_ids, counts):
+        if self.dirty:
+            self.freeze()
+        from scipy import sparse
+        n = self.n_terms
+        self.csr.resize((n, n))
+        self.csr = (self.csr + sparse.csr_matrix((counts, (left_ids, right_ids)), shape=(n, n))).tocsr()
+        self.freeze()
+
+    def freeze(self):
+        '''merge the pending COO pairs into the CSR/CSC matrices and refresh the degree and weight vectors'''
+        from scipy import sparse
+        n = self.n_terms
+        pending = sparse.coo_matrix((np.ones(len(self.rows)), (np.frombuffer(self.rows, dtype=np.int32), np.frombuffer(self.cols, dtype=np.int32))), shape=(n, n))
+        frozen = self.csr
+        frozen.resize((n, n))
+
+        self.csr = (frozen + pending.tocsr()).tocsr()
+        self.csr.sum_duplicates()
+        self.csr.sort_indices()
+        self.csc = self.csr.tocsc()
+        self.csc.sort_indices()
+        self.rows = array('i')
+        self.cols = array('i')
+        self.dirty = False
+
+        self.out_degrees = np.diff(self.csr.indptr)
+        self.in_degrees = np.diff(self.csc.indptr)
+        self.out_weights = np.asarray(self.csr.sum(axis=1)).ravel()
+        self.in_weights = np.asarray(self.csc.sum(axis=0)).ravel()
+        # row * n_terms + column of every stored edge, sorted, to look edges up with a binary search
+        self.edge_keys = np.repeat(np.arange(n, dtype=np.int64), self.out_degrees) * n + self.csr.indices
+
+    def weights(self, left_ids, right_ids):
+        '''co-occurrence counts of the (left, right) pairs, 0 for pairs that never co-occurred'''
+        if self.dirty:
+            self.freeze()
+        keys = np.asarray(left_ids, dtype=np.int64) * self.n_terms + np.asarray(right_ids, dtype=np.int64)
+        if len(self.edge_keys) == 0:
+            return np.zeros(len(keys))
+        positions = np.minimum(np.searchsorted(self.edge_keys, keys), len(self.edge_keys) - 1)
+        return np.where(self.edge_keys[positions] == keys, self.csr.data[positions], 0.)
+
+    def weight(self, left_id, right_id):
+        return float(self.weights([left_id], [right_id])[0])
+
+    def successors(self, term_id):
+        if self.dirty:
+            self.freeze()
+        return self.csr.indices[self.csr.indptr[term_id]:self.csr.indptr[term_id+1]].tolist()
+
+    def predecessors(self, term_id):
+        if self.dirty:
+            self.freeze()
+        return self.csc.indices[self.csc.indptr[term_id]:self.csc.indptr[term_id+1]].tolist()
+
+    def out_degree(self, term_id):
+        if self.dirty:
+            self.freeze()
+        return int(self.out_degrees[term_id])
+
+    def out_weight(self, term_id):
+        if self.dirty:
+            self.freeze()
+        return float(self.out_weights[term_id])
+
+    def in_degree(self, term_id):
+        if self.dirty:
+            self.freeze()
+        return int(self.in_degrees[term_id])
+
+    def in_weight(self, term_id):
+        if self.dirty:
+            self.freeze()
+        return float(self.in_weights[term_id])
+
+    def adjacency(self):
+        '''n_terms x n_terms CSR matrix of the co-occurrence counts'''
+        if self.dirty:
+            self.freeze()
+        return self.csr
+
+    def degrees(self):
+        '''out degree, out weight, in degree and in weight of every term, as arrays indexed by term id'''
+        if self.dirty:
+            self.freeze()
+        return self.out_degrees, self.out_weights, self.in_degrees, self.in_weights
@@ -1,16 +1,19 @@
 # -*- coding: utf-8 -*-
 from .models import *
-import requests
-import time
+from .http import HttpClient
+from collections import deque
+from itertools import islice
 
 class BingNewsSearchAPI(BaseDataSource):
 	URL_REQUEST = 'https://api.cognitive.microsoft.com/bing/v7.0/news/search'
 	
-	def __init__(self, api_key, processes=4):
+	def __init__(self, api_key, processes=4, cache=None, max_rate=None):
+		'''max_rate caps the requests per second, e.g. to the quota of the subscription. Throttled requests are retried, see self.http.stats()'''
 		BaseDataSource.__init__(self, 'BingNewsSearchAPI')
 		self.api_key = api_key
 		
 		self.processes = processes		
+		self.http = HttpClient(max_in_flight=processes, max_per_host=processes, timeout=None, cache=cache, max_rate=max_rate)
 		self.headers = {"Ocp-Apim-Subscription-Key" : api_key}
 		self.max_documents = 2000
 
@@ -22,13 +25,19 @@ class BingNewsSearchAPI(BaseDataSource):
 		result_item = ResultHeadLine(headline=item['name'], datetime=pubdate, domain=domain_name, url=item['url'])
 		return result_item
 
+	def getPage(self, params, offset):
+		'''articles of the page of params starting at offset'''
+		response = self.http.get(BingNewsSearchAPI.URL_REQUEST, headers=self.headers, params=dict(params, offset=offset))
+		response.raise_for_status()
+		return response.json()["value"]
+
 	def getResult(self, query, **kwargs):
 		
 		params  = {"q": query, "count":"100", "mkt":"en-US"}
 		
 		headers = {"Ocp-Apim-Subscription-Key" : self.api_key}
 
-		response = requests.get(BingNewsSearchAPI.URL_REQUEST, headers=headers, params=params)
+		response = self.http.get(BingNewsSearchAPI.URL_REQUEST, headers=headers, params=params)
 		response.raise_for_status()
 		search_results = response.json()
 
@@ -41,31 +50,36 @@ class BingNewsSearchAPI(BaseDataSource):
 
 		#first page rows
 		results = []		
-		
-		for article in search_results["value"]:
-			results.append(self.parse_news_article(article))
+		seen_urls = set()
 
-		#next pages if available
-		for page in range(0, num_pages + 1)[:200]:
-			offset = page * page_size
-			params["offset"] = offset
-		
-			#response = requests.get(search_url, headers=headers, params=params)
-			print (base_search_query_url,"offset:"+str(offset))
-		
-			if(page % 3 == 0):
-				print("sleep")
-				time.sleep(0.5)
-		
-			response = requests.get(BingNewsSearchAPI.URL_REQUEST, headers=self.headers, params=params)
-			response.raise_for_status()
-			search_results = response.json()
+		def add_articles(articles):
+			for article in articles:
+				if article["url"] not in seen_urls:
+					seen_urls.add(article["url"])
+					results.append(self.parse_news_article(article))
+
+		add_articles(search_results["value"])
+
+		#next pages if available, the offsets are known so up to self.processes of them are fetched at a time.
+		#pages are consumed in offset order, keeping the order of the sequential fetch
+		offsets = iter([ page * page_size for page in range(1, num_pages + 1)[:199] ])
+		pending = deque()
+		try:
+			for offset in islice(offsets, self.processes):
+				pending.append(self.http.submit(self.getPage, params, offset))
 
-			for article in search_results["value"]:
-				results.append(self.parse_news_article(article))
+			while pending and len(results) < self.max_documents:
+				articles = pending.popleft().result()
+				if not articles:
+					#past the last result, totalEstimatedMatches is only an estimate
+					break
 
-			if(len(results) > self.max_documents ):
-				
-				break
+				add_articles(articles)
+				for offset in islice(offsets, 1):
+					pending.append(self.http.submit(self.getPage, params, offset))
+		finally:
+			#requests not sent yet are dropped, those already sent are left to finish
+			for future in pending:
+				future.cancel()
 
-		return results
+		return results[:self.max_documents]
@@ -0,0 +1,58 @@
+# -*- coding: utf-8 -*-
+from ..cache import DiskCache
+import hashlib
+import json
+import os
+import time
+
+
+class CacheMiss(Exception):
+	'''raised by a ResponseCache in replay mode for a request it does not hold'''
+	pass
+
+
+class ResponseCache(DiskCache):
+	'''On-disk cache of the responses of the datasources, shared by all of them.
+
+	Entries are named by the hash of the request method, URL and sorted parameters, see DiskCache for the
+	storage and the eviction. Entries older than ttl seconds are stale. In replay mode nothing is fetched:
+	a request missing from the cache raises CacheMiss.'''
+
+	MODES = ('readwrite', 'replay')
+
+	def __init__(self, directory=os.path.join(os.path.expanduser('~'), '.cache', 'contamehistorias', 'responses'), max_size=1024*1024*1024, ttl=None, mode='readwrite'):
+		if mode not in ResponseCache.MODES:
+			raise ValueError('Unknown cache mode: ' + str(mode))
+
+		DiskCache.__init__(self, directory, max_size)
+		self.ttl = ttl
+		self.mode = mode
+
+	@staticmethod
+	def key(method, url, params=None):
+		'''hash of the request, parameters are compared as strings and in any order'''
+		params = sorted([ (str(name), str(value)) for name, value in dict(params or {}).items() ])
+		return hashlib.sha256(json.dumps([method.upper(), url, params]).encode('utf-8')).hexdigest()
+
+	def get(self, key):
+		'''cached value of key, or None. Raises CacheMiss instead in replay mode'''
+		entry = self.read(key)
+		if entry is not None and self.ttl is not None and time.time() - entry['stored_at'] > self.ttl:
+			entry = None
+
+		if entry is None:
+			self.misses += 1
+			if self.mode == 'replay':
+				raise CacheMiss(key)
+			return None
+
+		self.touch(key)
+		self.hits += 1
+		return entry['value']
+
+	def put(self, key, value):
+		'''store the JSON serializable value under key'''
+		if self.mode == 'replay':
+			return
+
+		self.write(key, {'stored_at': time.time(), 'value': value})
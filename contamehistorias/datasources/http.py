@@ -0,0 +1,222 @@
+# -*- coding: utf-8 -*-
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlparse
+from collections import Counter
+from .cache import ResponseCache
+import threading
+import requests
+import random
+import base64
+import time
+
+class HostLimit(object):
+	'''AIMD window of the requests in flight to one host. A response faster than twice the fastest one seen
+	widens the window by 1/limit, so by about one request per window, up to max_limit. A throttled request halves it'''
+
+	def __init__(self, max_limit):
+		self.max_limit = max_limit
+		self.limit = max(1., max_limit // 2)
+		self.in_flight = 0
+		self.min_latency = None
+		self.condition = threading.Condition()
+
+	def acquire(self):
+		with self.condition:
+			while self.in_flight >= int(self.limit):
+				self.condition.wait()
+			self.in_flight += 1
+
+	def release(self, latency=None, throttled=False):
+		with self.condition:
+			self.in_flight -= 1
+			if throttled:
+				self.limit = max(1., self.limit / 2)
+			elif latency is not None:
+				if self.min_latency is None or latency < self.min_latency:
+					self.min_latency = latency
+				if latency <= 2 * self.min_latency:
+					self.limit = min(float(self.max_limit), self.limit + 1. / self.limit)
+			self.condition.notify_all()
+
+class RateController(object):
+	'''Rate and concurrency control of the requests of one datasource.
+
+	A token bucket holds the request rate under max_rate requests per second (no bound if None), and a
+	HostLimit adapts the requests in flight to each host. Requests answered with 429 or 5xx, timing out or
+	losing their connection are retried up to max_retries times, after a jittered exponential backoff or
+	after the Retry-After of the response. stats() counts the requests, retries and throttled responses'''
+
+	THROTTLE_STATUS = (429, 500, 502, 503, 504)
+
+	def __init__(self, max_per_host=4, max_rate=None, burst=1, max_retries=4, backoff=0.5, max_backoff=30.):
+		self.max_per_host = max_per_host
+		self.max_rate = max_rate
+		self.burst = burst
+		self.max_retries = max_retries
+		self.backoff = backoff
+		self.max_backoff = max_backoff
+
+		self.tokens = float(burst)
+		self.last_refill = time.monotonic()
+		self.hosts = {}
+		self.counters = Counter()
+		self.lock = threading.Lock()
+
+	def host_limit(self, host):
+		with self.lock:
+			if host not in self.hosts:
+				self.hosts[host] = HostLimit(self.max_per_host)
+			return self.hosts[host]
+
+	def take_token(self):
+		if self.max_rate is None:
+			return
+		while True:
+			with self.lock:
+				now = time.monotonic()
+				self.tokens = min(float(self.burst), self.tokens + (now - self.last_refill) * self.max_rate)
+				self.last_refill = now
+				if self.tokens >= 1.:
+					self.tokens -= 1.
+					return
+				wait = (1. - self.tokens) / self.max_rate
+			time.sleep(wait)
+
+	def count(self, name):
+		with self.lock:
+			self.counters[name] += 1
+
+	def retry_delay(self, attempt, retry_after=None):
+		'''seconds to wait before retry number attempt+1'''
+		if retry_after is not None:
+			try:
+				return min(self.max_backoff, float(retry_after))
+			except ValueError:
+				pass
+		return random.uniform(0.5, 1.5) * min(self.max_backoff, self.backoff * 2 ** attempt)
+
+	def call(self, host, request):
+		'''response of request(), a function sending one request to host, retried while throttled.
+		The response, or the exception raised, carries the number of requests sent in attempts'''
+		limit = self.host_limit(host)
+		attempt = 0
+		while True:
+			self.take_token()
+			limit.acquire()
+			self.count('requests')
+			start = time.monotonic()
+			try:
+				response = request()
+			except (requests.exceptions.Timeout, requests.exceptions.ConnectionError) as e:
+				limit.release(throttled=True)
+				self.count('timeouts' if isinstance(e, requests.exceptions.Timeout) else 'connection_errors')
+				if attempt >= self.max_retries:
+					self.count('failures')
+					e.attempts = attempt + 1
+					raise
+				retry_after = None
+			except BaseException as e:
+				limit.release()
+				self.count('failures')
+				e.attempts = attempt + 1
+				raise
+			else:
+				response.attempts = attempt + 1
+				if response.status_code not in RateController.THROTTLE_STATUS:
+					limit.release(latency=time.monotonic() - start)
+					return response
+
+				limit.release(throttled=True)
+				self.count('throttled' if response.status_code == 429 else 'server_errors')
+				if attempt >= self.max_retries:
+					self.count('failures')
+					return response
+				retry_after = response.headers.get('Retry-After')
+
+			self.count('retries')
+			time.sleep(self.retry_delay(attempt, retry_after))
+			attempt += 1
+
+	def stats(self):
+		with self.lock:
+			stats = dict([ (name, self.counters[name]) for name in ('requests', 'retries', 'throttled', 'server_errors', 'timeouts', 'connection_errors', 'failures') ])
+			stats['limits'] = dict([ (host, limit.limit) for host, limit in self.hosts.items() ])
+		return stats
+
+class HttpClient(object):
+	'''Blocking requests run by a pool of threads over one keep-alive requests.Session.
+	max_in_flight bounds the requests running at the same time and max_per_host those sent to a single host,
+	within which a RateController adapts the requests in flight and retries the throttled ones.
+	With a ResponseCache, successful responses are stored and later served from disk'''
+
+	def __init__(self, max_in_flight=8, max_per_host=4, timeout=45, cache=None, max_rate=None, max_retries=4):
+		self.max_in_flight = max_in_flight
+		self.max_per_host = max_per_host
+		self.timeout = timeout
+		self.cache = cache
+		self.rate = RateController(max_per_host=max_per_host, max_rate=max_rate, max_retries=max_retries)
+
+		self.session = requests.Session()
+		adapter = requests.adapters.HTTPAdapter(pool_connections=max_in_flight, pool_maxsize=max_per_host)
+		self.session.mount('http://', adapter)
+		self.session.mount('https://', adapter)
+
+		self.executor = None
+		self.lock = threading.Lock()
+
+	def __enter__(self):
+		return self
+
+	def __exit__(self, exc_type, exc_value, traceback):
+		self.close()
+
+	def close(self):
+		if self.executor is not None:
+			self.executor.shutdown()
+			self.executor = None
+		self.session.close()
+
+	def get(self, url, params=None, headers=None, timeout=None):
+		'''session.get under the RateController of the client. Headers are not part of the cache key'''
+		if self.cache is not None:
+			key = ResponseCache.key('GET', url, params)
+			record = self.cache.get(key)
+			if record is not None:
+				return HttpClient.response_from_record(record)
+
+		timeout = self.timeout if timeout is None else timeout
+		response = self.rate.call(urlparse(url).netloc, lambda: self.session.get(url, params=params, headers=headers, timeout=timeout))
+
+		if self.cache is not None and response.status_code == 200:
+			self.cache.put(key, HttpClient.response_to_record(response))
+		return response
+
+	@staticmethod
+	def response_to_record(response):
+		return {'status_code': response.status_code, 'url': response.url, 'encoding': response.encoding,
+			'headers': dict(response.headers), 'content': base64.b64encode(response.content).decode('ascii')}
+
+	@staticmethod
+	def response_from_record(record):
+		response = requests.models.Response()
+		response.status_code = record['status_code']
+		response.url = record['url']
+		response.encoding = record['encoding']
+		response.headers = requests.structures.CaseInsensitiveDict(record['headers'])
+		response._content = base64.b64decode(record['content'])
+		return response
+
+	def stats(self):
+		return self.rate.stats()
+
+	def submit(self, func, *args):
+		'''run func(*args) on the thread pool, returns its Future'''
+		with self.lock:
+			if self.executor is None:
+				self.executor = ThreadPoolExecutor(max_workers=self.max_in_flight)
+		return self.executor.submit(func, *args)
+
+	def map(self, func, args_list):
+		'''func(*args) for every args in args_list, run on the thread pool, in the order of args_list'''
+		futures = [ self.submit(func, *args) for args in args_list ]
+		return [ future.result() for future in futures ]
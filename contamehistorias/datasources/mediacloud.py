@@ -1,8 +1,8 @@
 # -*- coding: utf-8 -*-
 from .models import *
 from .utils import *
+from .cache import ResponseCache
 
-import mediacloud
 import json
 import dateutil.relativedelta
 from datetime import datetime
@@ -10,15 +10,18 @@ from urllib.parse import urlparse
 
 class MediaCloudSearchAPI(BaseDataSource):
 	
-	def __init__(self, api_key):
+	def __init__(self, api_key, cache=None):
+		'''the mediacloud client does its own HTTP requests, with a ResponseCache the storyList pages are cached instead'''
 		BaseDataSource.__init__(self, 'MediaCloudSearchAPI')
 		self.api_key = api_key
+		self.cache = cache
 		
 	def getResult(self, query, **kwargs):
 		
 		if not(self.api_key):
 			raise ValueError("Please specify API key")
 
+		import mediacloud.api
 		self.mc = mediacloud.api.MediaCloud(self.api_key)
 		
 		start_date = None
@@ -45,7 +48,7 @@ class MediaCloudSearchAPI(BaseDataSource):
 		last_processed_stories_id = 0
 		
 		while len(stories) < 5000:
-			fetched_stories = self.mc.storyList(query +' AND (language:'+language+')', 
+			fetched_stories = self.story_list(query +' AND (language:'+language+')', 
 										solr_filter=self.mc.publish_date_query(start_date, end_date),
 										last_processed_stories_id=last_processed_stories_id, 
 										rows= fetch_size)
@@ -69,4 +72,15 @@ class MediaCloudSearchAPI(BaseDataSource):
 			result.append(result_item)
 
 		
-		return result		
\ No newline at end of file
+		return result
+
+	def story_list(self, solr_query, **params):
+		if self.cache is None:
+			return self.mc.storyList(solr_query, **params)
+
+		key = ResponseCache.key('storyList', 'mediacloud.api', dict(params, solr_query=solr_query))
+		stories = self.cache.get(key)
+		if stories is None:
+			stories = self.mc.storyList(solr_query, **params)
+			self.cache.put(key, stories)
+		return stories
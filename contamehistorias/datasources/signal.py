@@ -1,16 +1,17 @@
 # -*- coding: utf-8 -*-
 from .models import *
 from .utils import *
+from .http import HttpClient
 
 from datetime import datetime
-import requests
 
 class SignalNewsIRDataset(BaseDataSource):
 	URL_REQUEST = 'http://194.117.29.148:8983/solr/signalnews-articles/select'
 	
-	def __init__(self, processes=4):
+	def __init__(self, processes=4, cache=None):
 		BaseDataSource.__init__(self, 'SignalNewsIRDataset')
 		self.processes = processes
+		self.http = HttpClient(max_in_flight=processes, max_per_host=processes, timeout=None, cache=cache)
 
 	def getResult(self, query, **kwargs):
 		
@@ -20,7 +21,7 @@ class SignalNewsIRDataset(BaseDataSource):
 			'fl': 'source,title,published'
 		}
 
-		response = requests.get(SignalNewsIRDataset.URL_REQUEST, params=params)
+		response = self.http.get(SignalNewsIRDataset.URL_REQUEST, params=params)
 		if response.status_code != 200:
 			return None
 
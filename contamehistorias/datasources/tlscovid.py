@@ -4,7 +4,11 @@ from datetime import datetime
 import requests
 import json
 
-from elasticsearch import Elasticsearch, helpers
+
+def scan(client, **kwargs):
+    # elasticsearch is imported on first use only, it is slow to import and only needed by this source
+    from elasticsearch import helpers
+    return helpers.scan(client, **kwargs)
 
 
 class RoundTripEncoder(json.JSONEncoder):
@@ -54,13 +58,21 @@ class ElasticSearchCovid(SearchEngine):
 
     URL_ELASTICSEARCH = 'http://localhost:9200/'
 
-    es = Elasticsearch(URL_ELASTICSEARCH)
+    es_client = None
 
     INPUT_FORMAT = '%Y-%m-%d'
 
     def __init__(self):
         SearchEngine.__init__(self, 'ElasticSearchCovid')
 
+    @property
+    def es(self):
+        '''Elasticsearch client, created on first use and shared by every instance'''
+        if ElasticSearchCovid.es_client is None:
+            from elasticsearch import Elasticsearch
+            ElasticSearchCovid.es_client = Elasticsearch(ElasticSearchCovid.URL_ELASTICSEARCH)
+        return ElasticSearchCovid.es_client
+
     def getResult(self, query, **kwargs):
 
         # kwargs must include index, and optionally a list of sources
@@ -142,7 +154,7 @@ class ElasticSearchCovid(SearchEngine):
             }
 
         # Query Elasticsearch
-        es_response = helpers.scan(
+        es_response = scan(
             self.es,
             index=index,
             query=query_body
@@ -195,7 +207,7 @@ class ElasticSearchCovid(SearchEngine):
             }
 
         # Query Elasticsearch
-        es_response = helpers.scan(
+        es_response = scan(
             self.es,
             index=index,
             query=query_body
@@ -287,7 +299,7 @@ class ElasticSearchCovid(SearchEngine):
     def get_topics(self):
 
         # Query Elasticsearch
-        es_response = helpers.scan(
+        es_response = scan(
             self.es,
             index='topics',
             query={"query": {"match_all": {}}}
@@ -321,7 +333,7 @@ class ElasticSearchCovid(SearchEngine):
         }
 
         # Query Elasticsearch
-        es_response = helpers.scan(
+        es_response = scan(
             self.es,
             index=index,
             query=query_body
@@ -373,7 +385,7 @@ class ElasticSearchCovid(SearchEngine):
         }
 
         # Query Elasticsearch
-        es_response = helpers.scan(
+        es_response = scan(
             self.es,
             index=index,
             query=query_body
@@ -418,7 +430,7 @@ class ElasticSearchCovid(SearchEngine):
         }
 
         # Query Elasticsearch
-        es_response = helpers.scan(
+        es_response = scan(
             self.es,
             index=index,
             query=query_body
@@ -9,8 +9,9 @@ SPECIAL_CHARACTERS_DICT =  dict([
 		(u'Ã§',u'ç'),
 		(u"Ã", u"í")])
 
+SPECIAL_CHARACTERS_PATTERN = re.compile("|".join([re.escape(k) for k in SPECIAL_CHARACTERS_DICT.keys()]), re.M)
+
 def multiple_replace(string):
-		pattern = re.compile("|".join([re.escape(k) for k in SPECIAL_CHARACTERS_DICT.keys()]), re.M)
-		return pattern.sub(lambda x: SPECIAL_CHARACTERS_DICT[x.group(0)], string)
+		return SPECIAL_CHARACTERS_PATTERN.sub(lambda x: SPECIAL_CHARACTERS_DICT[x.group(0)], string)
 
 
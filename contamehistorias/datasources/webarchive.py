@@ -1,12 +1,12 @@
 from .models import *
 from .utils import *
+from .http import HttpClient
 
 import random
 import time
+from concurrent.futures import wait, FIRST_COMPLETED
 from datetime import datetime
 from collections import Counter, namedtuple
-from multiprocessing import Pool
-from itertools import repeat
 from urllib.parse import urlparse
 import requests, json
 import re
@@ -15,12 +15,18 @@ class ArquivoPT(BaseDataSource):
 	URL_REQUEST = 'http://arquivo.pt/textsearch'
 	DATETIME_FORMAT = '%Y%m%d%H%M%S'
 	
-	def __init__(self, max_items_per_site=500, domains_by_request=2, processes=2, docs_per_query=1000):
+	def __init__(self, max_items_per_site=500, domains_by_request=2, processes=None, docs_per_query=1000, max_in_flight=8, max_per_host=4, cache=None, max_retries=4):
+		'''requests for the domain chunks are sent by a thread pool sharing one keep-alive session:
+		max_in_flight of them at a time, at most max_per_host to the same host. processes, if given, overrides max_in_flight.
+		Timed out and throttled requests are retried max_retries times, see self.http.stats().
+		cache is an optional datasources.cache.ResponseCache'''
 		BaseDataSource.__init__(self, 'ArquivoPT')
 		self.max_items_per_site = max_items_per_site
 		self.domains_by_request = domains_by_request
-		self.processes = processes
-		self.docs_per_query = docs_per_query	
+		self.docs_per_query = docs_per_query
+		if processes is not None:
+			max_in_flight = processes
+		self.http = HttpClient(max_in_flight=max_in_flight, max_per_host=max_per_host, timeout=45, cache=cache, max_retries=max_retries)
 	
 	def _select_text_to_keep(self, text, search_result, loc):
 		# Whole match
@@ -70,7 +76,7 @@ class ArquivoPT(BaseDataSource):
 		
 		return text
 
-	def getResult(self, query, **kwargs):
+	def _domains_chunks(self, query, kwargs):
 		domains = kwargs['domains']
 		
 		if not(domains):
@@ -81,10 +87,14 @@ class ArquivoPT(BaseDataSource):
 		interval = ( kwargs['from'].strftime(ArquivoPT.DATETIME_FORMAT), kwargs['to'].strftime(ArquivoPT.DATETIME_FORMAT) )
 
 		domains_chunks = [domains[i:i + min(self.domains_by_request, len(domains))] for i in range(0, len(domains), min(self.domains_by_request, len(domains)))]
+
+		return domains_chunks, interval
+
+	def getResult(self, query, **kwargs):
+		domains_chunks, interval = self._domains_chunks(query, kwargs)
 		
 		#run requests in parallel
-		with Pool(processes=self.processes) as pool:
-			results_by_domain = pool.starmap(self.getResultsByDomain, zip(domains_chunks, repeat(query), repeat(interval)))
+		results_by_domain = self.http.map(self.getResultsByDomain, [ (domains_chunk, query, interval) for domains_chunk in domains_chunks ])
 		
 		all_results = []
 		for dominio_list in [ dominio_list for dominio_list in results_by_domain if dominio_list is not None ]:
@@ -92,8 +102,60 @@ class ArquivoPT(BaseDataSource):
 
 		return all_results
 
-	def getResultsByDomain(self, domains, query, interval):
+	def stream_results(self, query, **kwargs):
+		'''generator of the ResultHeadLine of query, yielded as the pages of the textsearch API arrive.
+		Takes the same arguments as getResult. Every domain chunk is paged through with offset until the API
+		gives no next_page, its domains hold max_items_per_site results each or a page brings no new result.
+		Results are counted under the requested domain they belong to, www.publico.pt under publico.pt.
+		A url is only yielded the first time it is seen'''
+		domains_chunks, interval = self._domains_chunks(query, kwargs)
 
+		items_by_site = Counter()
+		seen_urls = set()
+
+		pending = {}
+		for domains_chunk in domains_chunks:
+			pending[self.http.submit(self.getPage, domains_chunk, query, interval, 0)] = (domains_chunk, 0)
+
+		try:
+			while pending:
+				done, _ = wait(pending, return_when=FIRST_COMPLETED)
+				for future in done:
+					domains_chunk, offset = pending.pop(future)
+					json_obj = future.result()
+					if json_obj is None:
+						continue
+
+					sites = [ urlparse(d).netloc for d in domains_chunk ]
+					new_items = 0
+					for item_result in self._parse_items(json_obj, interval):
+						site = ArquivoPT._site(item_result.domain, sites)
+						if item_result.url in seen_urls or items_by_site[site] >= self.max_items_per_site:
+							continue
+						seen_urls.add(item_result.url)
+						items_by_site[site] += 1
+						new_items += 1
+						yield item_result
+
+					n_items = len(json_obj['response_items'])
+					chunk_full = all([ items_by_site[site] >= self.max_items_per_site for site in sites ])
+					if json_obj.get('next_page') and new_items > 0 and not chunk_full:
+						pending[self.http.submit(self.getPage, domains_chunk, query, interval, offset + n_items)] = (domains_chunk, offset + n_items)
+		finally:
+			# the consumer stopped early, drop the pages not yet requested
+			for future in pending:
+				future.cancel()
+
+	@staticmethod
+	def _site(netloc, sites):
+		'''the site of sites netloc is in, netloc itself if none'''
+		for site in sites:
+			if netloc == site or netloc.endswith('.' + site):
+				return site
+		return netloc
+
+	def getPage(self, domains, query, interval, offset=0):
+		'''json of the textsearch page of query over domains starting at offset, None if the request failed'''
 		itemsPerSite = min( self.max_items_per_site , int(2000/len(domains)))
 		siteSearch = ','.join([urlparse(d).netloc for d in domains])
 
@@ -107,20 +169,27 @@ class ArquivoPT(BaseDataSource):
 			'type':'html',
 			'fields': 'originalURL,title,tstamp,encoding,linkToArchive'
 		}
+		if offset:
+			params['offset'] = offset
 
 		try:
-			response = requests.get(ArquivoPT.URL_REQUEST, params=params, timeout=45)
+			response = self.http.get(ArquivoPT.URL_REQUEST, params=params)
 			
-		except:
-			print('Timeout domains =', domains)
+		except requests.exceptions.RequestException as e:
+			self.report_failure(domains, getattr(e, 'attempts', 1), e)
 			return
 
 		if response.status_code != 200:
+			self.report_failure(domains, getattr(response, 'attempts', 1), 'HTTP %d' % response.status_code)
 			return
 
-		json_obj = response.json()
-		results = {}
-		
+		return response.json()
+
+	def report_failure(self, domains, attempts, reason):
+		stats = self.http.stats()
+		print('Failed domains = %s after %d attempt(s): %s (retries %d, failures %d so far)' % (domains, attempts, reason, stats['retries'], stats['failures']))
+
+	def _parse_items(self, json_obj, interval):
 		for item in json_obj['response_items']:
 			if not (interval[0] < item['tstamp'] < interval[1]):
 				continue
@@ -141,16 +210,26 @@ class ArquivoPT(BaseDataSource):
 
 			except:
 				#ignore entried with invalid date format
-				pass
+				continue
 
-			if url_domain not in results:
-				results[url_domain] = {}
+			yield item_result
+
+	def getResultsByDomain(self, domains, query, interval):
+		json_obj = self.getPage(domains, query, interval)
+		if json_obj is None:
+			return
+
+		results = {}
+		
+		for item_result in self._parse_items(json_obj, interval):
+			if item_result.domain not in results:
+				results[item_result.domain] = {}
 			
-			if item_result.url not in results[url_domain] or results[url_domain][item_result.url].datetime > item_result.datetime:
-				results[url_domain][item_result.url] = item_result
+			if item_result.url not in results[item_result.domain] or results[item_result.domain][item_result.url].datetime > item_result.datetime:
+				results[item_result.domain][item_result.url] = item_result
 
 		result_array = []
 		for domain in results.values():
 			result_array.extend( list(domain.values()) )
 
-		return result_array
\ No newline at end of file
+		return result_array
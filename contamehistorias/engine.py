@@ -1,31 +1,269 @@
 # -*- coding: utf-8 -*-
 
-from .datacore import DataCore
+from .datacore import DataCore, TokenizationCache, get_stopword_set
 
 from itertools import repeat
 from collections import Counter, namedtuple
 from os import path
-from scipy import signal
 from glob import glob
 from .Levenshtein import Levenshtein
+from .minhash import MinHashLSH
+from .cache import ResultCache
 import time
+import heapq
+import bisect
+import json
+from datetime import timedelta
 import numpy as np
-from stop_words import get_stop_words
 import multiprocessing
-from joblib import Parallel, delayed
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
 
 ProcessedHeadline = namedtuple('ProcessedHeadline', ['info', 'candidates', 'terms'])
 Keyphrase = namedtuple('Keyphrase', ['kw', 'cand_obj', 'headlines'])
 Term = namedtuple('Term', ['term', 'tf', 'h'])
+# Picklable view of a chunk for the workers: doc_ptr/cand_ids index the candidates of each document (CSR),
+# and H, size, first_seen and kws describe the chunk-local candidates
+ChunkPayload = namedtuple('ChunkPayload', ['doc_ids', 'doc_ptr', 'cand_ids', 'H', 'size', 'first_seen', 'kws'])
+
+def build_datacore_shard(texts, stopword_set, windows_size, cooccurrence):
+	'''DataCore of a shard of the documents, with the candidate and term keys of each document, for DataCore.merge'''
+
+	dc = DataCore(windows_size=windows_size, stopword_set=stopword_set, cooccurrence=cooccurrence)
+	documents = []
+	for text in texts:
+		document_candidates, term_in_doc = dc.add_document(text)
+		documents.append( (list(document_candidates.keys()), list(term_in_doc.keys())) )
+	return dc, documents
+
+def pack_chunk(chunk):
+	'''build the ChunkPayload of a chunk, returns it with the Keyphrase behind each chunk-local candidate id'''
+
+	local_id = {}
+	keyphrases = []
+	doc_local_id = {}
+	doc_ids = []
+	doc_ptr = [0]
+	cand_ids = []
+
+	for doc_proc in chunk:
+		doc_ids.append(doc_local_id.setdefault(id(doc_proc.info), len(doc_local_id)))
+		for kw in doc_proc.candidates:
+			if kw.kw not in local_id:
+				local_id[kw.kw] = len(keyphrases)
+				keyphrases.append(kw)
+			cand_ids.append(local_id[kw.kw])
+		doc_ptr.append(len(cand_ids))
+
+	one_us = timedelta(microseconds=1)
+	reference = chunk[0].info.datetime
+
+	payload = ChunkPayload(
+		doc_ids=np.array(doc_ids, dtype=np.int32),
+		doc_ptr=np.array(doc_ptr, dtype=np.int32),
+		cand_ids=np.array(cand_ids, dtype=np.int32),
+		H=np.array([ kw.cand_obj.H for kw in keyphrases ], dtype=np.float64),
+		size=np.array([ kw.cand_obj.size for kw in keyphrases ], dtype=np.int32),
+		first_seen=np.array([ (min([ t.info.datetime for t in kw.headlines ]) - reference) // one_us for kw in keyphrases ], dtype=np.int64),
+		kws=[ kw.kw for kw in keyphrases ]
+	)
+
+	return payload, keyphrases
+
+def select_chunk_keyphrases(payload, top, similarity_threshold, min_size=4):
+	'''the top keyphrases of a chunk, returns the chunk-local ids of the selected keyphrases.
+	Every document proposes its most relevant keyphrase not yet proposed by an earlier one; those of at least
+	min_size are taken by relevance while distinct from the ones already taken, then ordered by first appearance'''
+
+	H = payload.H.tolist()
+	doc_ptr = payload.doc_ptr.tolist()
+	cand_ids = payload.cand_ids.tolist()
+	kws = set()
+	seen = set()
+	to_analyse = []
+
+	for d, doc_id in enumerate(payload.doc_ids.tolist()):
+		# Sort by relevance
+		cands = sorted(cand_ids[doc_ptr[d]:doc_ptr[d+1]], key=lambda i: H[i])
+		for i in cands:
+			if i not in kws:
+				kws.add(i)
+				# Include only one entry per news
+				if doc_id not in seen:
+					seen.add(doc_id)
+					to_analyse.append(i)
+
+	size = payload.size.tolist()
+	to_analyse = sorted([ i for i in to_analyse if size[i] >= min_size ], key=lambda i: H[i])
+
+	selected = []
+	index = KeyphraseIndex(similarity_threshold)
+	for i in to_analyse:
+		if index.is_distinct(payload.kws[i]):
+			index.add(payload.kws[i])
+			selected.append(i)
+
+		if len(selected) == top:
+			break
+
+	first_seen = payload.first_seen.tolist()
+	return sorted(selected, key=lambda i: first_seen[i])
+
+def is_distinct_keyphrase(kw, accepted_kws, similarity_threshold):
+	'''evaluate if keyphrase kw is different enought from the accepted ones'''
+
+	for kw2, dd in zip(accepted_kws, Levenshtein.ratio_many(kw, accepted_kws)):
+		if dd > similarity_threshold or kw in kw2 or kw2 in kw:
+			return False
+
+	return True
+
+class KeyphraseIndex(object):
+	'''Accepted keyphrases blocked by length and shared q-grams.
+
+	is_distinct answers like is_distinct_keyphrase against every accepted keyphrase, but a bounded edit
+	distance is only computed for the ones within the length window that share enough q-grams'''
+
+	def __init__(self, similarity_threshold, q=3):
+		self.similarity_threshold = similarity_threshold
+		self.q = q
+		self.kws = []
+		self.n_qgrams = []
+		# q-gram -> ids of the accepted keyphrases containing it
+		self.postings = {}
+		# (length, id) of the accepted keyphrases, sorted
+		self.by_length = []
+
+	def qgrams(self, kw):
+		return set([ kw[i:i+self.q] for i in range(len(kw) - self.q + 1) ])
+
+	def max_distance(self, length):
+		'''upper bound of the distances that can give a ratio above similarity_threshold for this length'''
+		return int((1. - self.similarity_threshold) * length) + 1
+
+	def add(self, kw):
+		kw_id = len(self.kws)
+		grams = self.qgrams(kw)
+		self.kws.append(kw)
+		self.n_qgrams.append(len(grams))
+		for gram in grams:
+			self.postings.setdefault(gram, []).append(kw_id)
+		bisect.insort(self.by_length, (len(kw), kw_id))
+
+	def length_window(self, length):
+		'''ids of the accepted keyphrases whose length is compatible with a ratio above similarity_threshold'''
+		lower = length - self.max_distance(length)
+		upper = (length + 1) / self.similarity_threshold if self.similarity_threshold > 0 else float('inf')
+		for kw_length, kw_id in self.by_length[bisect.bisect_left(self.by_length, (lower, -1)):]:
+			if kw_length > upper:
+				break
+			yield kw_id
+
+	def is_distinct(self, kw):
+		grams = self.qgrams(kw)
+		shared = Counter([ kw_id for gram in grams for kw_id in self.postings.get(gram, ()) ])
+
+		# One keyphrase can only contain the other if all q-grams of the smaller one are shared
+		for kw_id, kw2 in enumerate(self.kws):
+			if shared[kw_id] == min(len(grams), self.n_qgrams[kw_id]) and (kw in kw2 or kw2 in kw):
+				return False
+
+		for kw_id in self.length_window(len(kw)):
+			kw2 = self.kws[kw_id]
+			length = max(len(kw), len(kw2))
+			max_distance = self.max_distance(length)
+
+			# q-gram lemma: each edit destroys at most q of the q-grams
+			if shared[kw_id] < max(len(grams), self.n_qgrams[kw_id]) - max_distance * self.q:
+				continue
+
+			dd = Levenshtein.bounded_distance(kw, kw2, max_distance)
+			if dd is not None and 1 - dd / float(length) > self.similarity_threshold:
+				return False
+
+		return True
 
 class TemporalSummarizationEngine(object):
+	EXECUTORS = ('serial', 'thread', 'process', 'pool')
+	# Below these sizes dispatching chunks to workers costs more than it saves
+	MIN_PARALLEL_CHUNKS = 2
+	MIN_PARALLEL_DOCS = 2000
+	# Ingestion shards must also pay for their merge and, tokenization holding the GIL, only gain on process workers
+	MIN_PARALLEL_INGEST_DOCS = 5000
+	# Sentence tokenizations shared by the DataCore of every engine in the process
+	TOKENIZATION_CACHE = TokenizationCache()
 	
-	def __init__(self, windows_size=2, top=20, similarity_threshold=0.8):
+	def __init__(self, windows_size=2, top=20, similarity_threshold=0.8, executor='process', n_jobs=None, near_duplicate_threshold=None, cooccurrence='graph', background=None):
+		'''executor selects how chunks are processed: 'serial', 'thread' or 'process' (a joblib Parallel per call),
+		'pool' (a process pool kept alive across calls until close) or any concurrent.futures.Executor.
+		n_jobs defaults to half of the available cores.
+		near_duplicate_threshold enables collapsing headlines whose shingle Jaccard similarity reaches it.
+		cooccurrence selects the DataCore co-occurrence backend, see DataCore.COOCCURRENCE_BACKENDS.
+		background, a background.BackgroundStatistics, seeds the DataCore of every query'''
 		self.windows_size = windows_size
 		self.stopwords = {}
 	
 		self.top = top
 		self.similarity_threshold = similarity_threshold
+		self.near_duplicate_threshold = near_duplicate_threshold
+		self.cooccurrence = cooccurrence
+		self.background = background
+
+		if executor not in TemporalSummarizationEngine.EXECUTORS and not isinstance(executor, Executor):
+			raise ValueError('Unknown executor: ' + str(executor))
+
+		if n_jobs is None:
+			n_jobs = multiprocessing.cpu_count()
+			if n_jobs > 1:
+				n_jobs = int(n_jobs/2)
+
+		self.executor = executor
+		self.n_jobs = n_jobs
+		self.pool = None
+
+	def __enter__(self):
+		return self
+
+	def __exit__(self, exc_type, exc_value, traceback):
+		self.close()
+
+	def close(self):
+		'''shut down the long-lived pool of the 'pool' executor, if it was started'''
+		if self.pool is not None:
+			self.pool.shutdown()
+			self.pool = None
+
+	def get_n_jobs(self, chunks):
+		'''number of workers worth using for chunks, 1 when they are too few or too small to pay the dispatch overhead'''
+
+		if self.executor == 'serial' or len(chunks) < TemporalSummarizationEngine.MIN_PARALLEL_CHUNKS:
+			return 1
+
+		if sum([ len(chunk) for chunk in chunks ]) < TemporalSummarizationEngine.MIN_PARALLEL_DOCS:
+			return 1
+
+		return max(1, min(self.n_jobs, len(chunks)))
+
+	def map_chunks(self, func, args_list, n_jobs):
+		'''run func(*args) for every args in args_list on the configured executor, keeping their order'''
+
+		if n_jobs == 1:
+			return [ func(*args) for args in args_list ]
+
+		from joblib import Parallel, delayed
+
+		if self.executor == 'thread':
+			return Parallel(n_jobs=n_jobs, prefer='threads')(delayed(func)(*args) for args in args_list)
+
+		if self.executor == 'process':
+			return Parallel(n_jobs=n_jobs)(delayed(func)(*args) for args in args_list)
+
+		executor = self.executor
+		if executor == 'pool':
+			if self.pool is None:
+				self.pool = ProcessPoolExecutor(max_workers=self.n_jobs)
+			executor = self.pool
+
+		return list(executor.map(func, *zip(*args_list)))
 
 	def get_index_of(self, t, intervals):
 
@@ -35,11 +273,87 @@ class TemporalSummarizationEngine(object):
 
 		return None
 
-	def get_chunk(self, sorted_resultset, qtd_intervals_param = 60, order = 2, percent=0.05):
+	def get_chunk(self, sorted_resultset, qtd_intervals_param = 60, order = 2, percent=0.05, engine='numpy'):
+		'''split the (datetime sorted) resultset into chunks at the valleys of the publication histogram.
+		engine='numpy' bins epoch timestamps with a sorted-edge lookup, engine='python' keeps the per-document interval scan'''
 
 		if len(sorted_resultset) < 2:
 			return []
 
+		if engine == 'numpy':
+			return self._get_chunk_numpy(sorted_resultset, qtd_intervals_param, order, percent)
+		elif engine == 'python':
+			return self._get_chunk_python(sorted_resultset, qtd_intervals_param, order, percent)
+
+		raise ValueError('Unknown get_chunk engine: ' + str(engine))
+
+	def _get_chunk_numpy(self, sorted_resultset, qtd_intervals_param, order, percent):
+
+		times = [ x.info.datetime for x in sorted_resultset ]
+		
+		interval_in_days = (times[-1]-times[0]).days
+		number_of_intervals = min(qtd_intervals_param, interval_in_days)
+		size_time_interval = (times[-1]-times[0])/number_of_intervals
+
+		# Same interval edges as the python engine, as int64 microseconds since the first document
+		one_us = timedelta(microseconds=1)
+		epoch_times = np.fromiter(((t - times[0]) // one_us for t in times), dtype=np.int64, count=len(times))
+		size_us = size_time_interval // one_us
+		edges = size_us * np.arange(number_of_intervals + 1, dtype=np.int64)
+
+		# Bin i covers [edges[i], edges[i+1]); documents past the last edge fall in no bin
+		interval_index = np.searchsorted(edges, epoch_times, side='right') - 1
+		cnt = np.bincount(interval_index[interval_index < number_of_intervals], minlength=number_of_intervals)
+
+		array_counted = np.concatenate((
+			[ cnt[0]/((order-virtual_index)+1) for virtual_index in range(order) ],
+			cnt,
+			[ cnt[number_of_intervals-1]/(virtual_index+2) for virtual_index in range(order) ]
+		))
+
+		from scipy import signal
+		indexes, = signal.argrelextrema(array_counted,comparator=np.greater,order=order)
+
+		idx_breaks = np.array([ indexes[i] + np.argmin(array_counted[indexes[i]:c]) for i, c in enumerate(indexes[1:]) ], dtype=np.int64)
+		centers = edges[idx_breaks - order + 1]
+
+		# A chunk closes at the first document after its center, and at most one chunk closes per document
+		n_docs = len(times)
+		steps = np.arange(len(centers))
+		first_after = np.searchsorted(epoch_times, centers, side='right')
+		breaks = np.maximum.accumulate(first_after - steps) + steps if len(centers) > 0 else steps
+		breaks = breaks[breaks < n_docs]
+
+		# The python engine appends the last document twice unless it stopped on a document after the last center
+		sequence = sorted_resultset
+		if len(centers) > 0 and (len(breaks) < len(centers) or breaks[-1] == n_docs - 1):
+			sequence = sorted_resultset + [sorted_resultset[-1]]
+
+		bounds = np.concatenate(([0], breaks, [len(sequence)]))
+		sizes = np.diff(bounds)
+
+		min_size_chunk = max(50, percent * sizes.max(), percent * n_docs )
+
+		# Merge small chunks forward until they exceed min_size_chunk
+		cuts = [0]
+		atual_size = 0
+		for end, size in zip(bounds[1:], sizes):
+			atual_size += size
+			if atual_size > min_size_chunk:
+				cuts.append(int(end))
+				atual_size = 0
+
+		if atual_size > 0:
+			if len(cuts) > 1:
+				cuts[-1] = len(sequence)
+			else:
+				return []
+
+		return [ sequence[start:end] for start, end in zip(cuts[:-1], cuts[1:]) ]
+
+	def _get_chunk_python(self, sorted_resultset, qtd_intervals_param, order, percent):
+		'''Reference implementation: linear interval scan per document.'''
+
 		times = [ x.info.datetime for x in sorted_resultset ]
 		
 		interval_in_days = (times[-1]-times[0]).days
@@ -60,6 +374,7 @@ class TemporalSummarizationEngine(object):
 		for virtual_index in range(order):
 			array_counted.append( cnt[number_of_intervals-1]/(virtual_index+2) )
 
+		from scipy import signal
 		indexes, = signal.argrelextrema(np.array(array_counted),comparator=np.greater,order=order)
 		
 		centers = []
@@ -106,34 +421,27 @@ class TemporalSummarizationEngine(object):
 		return final_chunks
 
 	def proc_chunk(self, chunk):
+		'''interval of a single chunk, see process_chunks'''
 
-		from_chunk_datetime = chunk[0].info.datetime
-		to_chunk_datetime = chunk[-1].info.datetime
-		kws = set()
-		seen = set()
-		to_analyse = []
-		
-		for doc_proc in chunk:
-			# Sort by relevance
-			cands = sorted(doc_proc.candidates, key=lambda x: x.cand_obj.H)
-			for kw in cands:
-				if kw.kw not in kws:
-					kws.add(kw.kw)
-					# Include only one entry per news
-					if doc_proc.info not in seen:
-						seen.add(doc_proc.info)
-						to_analyse.append(kw)
-
-		result_chunk, _ = self.extract_keyphrases(to_analyse)
-
-		result_interval = { 
-			'from':from_chunk_datetime, 
-			'to':to_chunk_datetime, 
-			'n_docs': len(chunk), 
-			'keyphrases': result_chunk 
-		}
+		return self.process_chunks([chunk])[0]
+
+	def process_chunks(self, chunks):
+		'''interval of every chunk, with the keyphrases select_chunk_keyphrases picks for it. Workers only receive
+		the compact ChunkPayload of their chunk, the selected keyphrases are mapped back to their Keyphrase objects here'''
+
+		packed = [ pack_chunk(chunk) for chunk in chunks ]
+		selected = self.map_chunks(select_chunk_keyphrases, [ (payload, self.top, self.similarity_threshold) for payload, _ in packed ], self.get_n_jobs(chunks))
 
-		return result_interval
+		results = []
+		for chunk, (_, keyphrases), selected_ids in zip(chunks, packed, selected):
+			results.append({
+				'from': chunk[0].info.datetime,
+				'to': chunk[-1].info.datetime,
+				'n_docs': len(chunk),
+				'keyphrases': [ keyphrases[i] for i in selected_ids ]
+			})
+
+		return results
 
 	def build_intervals(self, resultset, lan, query, use_headline=True, top_terms=20):
 		
@@ -144,10 +452,18 @@ class TemporalSummarizationEngine(object):
 		
 		sorted_resultset = sorted(resultset, key=lambda x: x.datetime)
 		sorted_resultset = self.evaluate_unique_headlines(sorted_resultset, use_headline=use_headline)
+
+		near_duplicates = {}
+		n_near_duplicates = 0
+		if self.near_duplicate_threshold is not None:
+			n_unique = len(sorted_resultset)
+			sorted_resultset, cluster_sizes = self.evaluate_near_duplicate_headlines(sorted_resultset, use_headline=use_headline)
+			n_near_duplicates = n_unique - len(sorted_resultset)
+			near_duplicates = { (hl.headline if use_headline else hl.title): size for hl, size in zip(sorted_resultset, cluster_sizes) if size > 1 }
 		
-		stopwords = get_stop_words(lan)
+		stopwords = get_stopword_set(lan)
 		
-		dc = DataCore(windows_size=self.windows_size, stopword_set=stopwords)
+		dc = DataCore(windows_size=self.windows_size, stopword_set=stopwords, cooccurrence=self.cooccurrence, tokenization_cache=TemporalSummarizationEngine.TOKENIZATION_CACHE, background=self.background)
 		
 		processed_headline = []
 		result_domains = []
@@ -157,14 +473,7 @@ class TemporalSummarizationEngine(object):
 		
 		news_for_timeline = []
 
-		for result in sorted_resultset:
-			# Set use_headline to False to use titles in tls-covid (ONLY in tls-covid, or datasets where both headline and title exist in ResultHeadline)
-			if use_headline:
-				document_candidates, term_in_doc = dc.add_document(result.headline)
-			else:
-				document_candidates, term_in_doc = dc.add_document(result.title)
-		
-			proc_head = ProcessedHeadline(info=result, candidates=[], terms=term_in_doc)
+		for proc_head in self.add_headlines(dc, sorted_resultset, all_key_candidates, use_headline=use_headline):
 
 			if proc_head.info.domain not in domain_id:
 				domain_id[proc_head.info.domain] = len(result_domains)
@@ -172,16 +481,6 @@ class TemporalSummarizationEngine(object):
 			
 			news_for_timeline.append( (str(proc_head.info.datetime), domain_id[proc_head.info.domain]) )
 
-			for cand, cand_obj in document_candidates.items():
-
-				if cand not in all_key_candidates:
-					all_key_candidates[cand] = Keyphrase( kw=cand_obj.unique_kw, cand_obj=cand_obj, headlines=[])
-
-				all_key_candidates[cand].headlines.append(proc_head)
-
-				if cand_obj.is_valid():
-					proc_head.candidates.append(all_key_candidates[cand])
-
 			processed_headline.append(proc_head)
 		
 		terms_correlations = [ (term_obj.unique_term, 1.-term_obj.bias) for term_obj in dc.add_bias(query)]
@@ -197,13 +496,7 @@ class TemporalSummarizationEngine(object):
 		chunks = self.get_chunk(processed_headline)
 
 		# Parallelize chunks processing
-		num_cores = multiprocessing.cpu_count()
-
-		if num_cores > 1:
-			num_cores = int(num_cores/2)
-
-		general_array_results = []
-		general_array_results.extend(Parallel(n_jobs=num_cores)(delayed(self.proc_chunk)(chunk) for chunk in chunks))
+		general_array_results = self.process_chunks(chunks)
 		
 		total_time_spent = time.time() - processing_time
 		
@@ -214,10 +507,12 @@ class TemporalSummarizationEngine(object):
 				'n_unique_docs': len(processed_headline), 
 				'n_docs':len(resultset), 
 				'n_domains': len(result_domains),
+				'n_near_duplicates': n_near_duplicates,
 				'time': total_time_spent
 			},
 
 			'domains': result_domains,
+			'near_duplicates': near_duplicates,
 			'query_term_corr': terms_correlations[:self.top*2],
 			'results': general_array_results,
 			'news_for_timeline': news_for_timeline,
@@ -226,6 +521,79 @@ class TemporalSummarizationEngine(object):
 	
 		return dict_result
 
+	def add_headlines(self, dc, resultset, all_key_candidates, use_headline=True):
+		'''add_headline for every ResultHeadLine in resultset, returns their ProcessedHeadline.
+		Resultsets of at least MIN_PARALLEL_INGEST_DOCS headlines are split in contiguous shards whose DataCore
+		are built by process workers and merged into dc in order, which gives the same DataCore as adding the
+		headlines one by one. Thread executors ingest serially'''
+
+		threads = self.executor == 'thread' or isinstance(self.executor, ThreadPoolExecutor)
+		if self.executor == 'serial' or threads or self.n_jobs == 1 or len(resultset) < TemporalSummarizationEngine.MIN_PARALLEL_INGEST_DOCS:
+			return [ self.add_headline(dc, result, all_key_candidates, use_headline=use_headline) for result in resultset ]
+
+		shard_size = -(-len(resultset) // self.n_jobs)
+		shards = [ resultset[i:i+shard_size] for i in range(0, len(resultset), shard_size) ]
+		n_jobs = len(shards)
+
+		args_list = [ ([ result.headline if use_headline else result.title for result in shard ], dc.stopword_set, dc.windowsSize, self.cooccurrence) for shard in shards ]
+		processed_headline = []
+		for shard, (shard_dc, documents) in zip(shards, self.map_chunks(build_datacore_shard, args_list, n_jobs)):
+			dc.merge(shard_dc)
+			for result, (candidate_keys, term_keys) in zip(shard, documents):
+				document_candidates = dict([ (cand, dc.candidates[cand]) for cand in candidate_keys ])
+				term_in_doc = dict([ (term, dc.terms[term]) for term in term_keys ])
+				processed_headline.append(self.link_headline(result, document_candidates, term_in_doc, all_key_candidates))
+		return processed_headline
+
+	def add_headline(self, dc, result, all_key_candidates, use_headline=True):
+		'''add one ResultHeadLine to dc and link it to its keyphrases in all_key_candidates'''
+
+		# Set use_headline to False to use titles in tls-covid (ONLY in tls-covid, or datasets where both headline and title exist in ResultHeadline)
+		if use_headline:
+			document_candidates, term_in_doc = dc.add_document(result.headline)
+		else:
+			document_candidates, term_in_doc = dc.add_document(result.title)
+
+		return self.link_headline(result, document_candidates, term_in_doc, all_key_candidates)
+
+	def link_headline(self, result, document_candidates, term_in_doc, all_key_candidates):
+		'''ProcessedHeadline of a document added to a DataCore, registered under its keyphrases in all_key_candidates'''
+	
+		proc_head = ProcessedHeadline(info=result, candidates=[], terms=term_in_doc)
+
+		for cand, cand_obj in document_candidates.items():
+
+			if cand not in all_key_candidates:
+				all_key_candidates[cand] = Keyphrase( kw=cand_obj.unique_kw, cand_obj=cand_obj, headlines=[])
+
+			all_key_candidates[cand].headlines.append(proc_head)
+
+			if cand_obj.is_valid():
+				proc_head.candidates.append(all_key_candidates[cand])
+
+		return proc_head
+
+	def build_serialized_intervals(self, resultset, lan, query, use_headline=True, top_terms=20, tls_covid=False, cache=None):
+		'''serialize(build_intervals(...)). With a ResultCache, headlines already summarized with the same
+		parameters, and the same background statistics, are read back from disk instead of being processed again'''
+
+		if cache is None:
+			result = self.build_intervals(resultset, lan, query, use_headline=use_headline, top_terms=top_terms)
+			return None if result is None else self.serialize(result, tls_covid=tls_covid)
+
+		key = ResultCache.key(resultset, lan=lan, query=query, use_headline=use_headline, top_terms=top_terms, tls_covid=tls_covid,
+			windows_size=self.windows_size, top=self.top, similarity_threshold=self.similarity_threshold, near_duplicate_threshold=self.near_duplicate_threshold,
+			background=None if self.background is None else self.background.fingerprint())
+
+		serialized = cache.get(key)
+		if serialized is None:
+			result = self.build_intervals(resultset, lan, query, use_headline=use_headline, top_terms=top_terms)
+			if result is None:
+				return None
+			serialized = cache.put(key, self.serialize(result, tls_covid=tls_covid))
+
+		return serialized
+
 	def evaluate_unique_headlines(self, resultset, use_headline=True):
 		final_resultset = []
 		unique_headlines = set()
@@ -242,57 +610,76 @@ class TemporalSummarizationEngine(object):
 
 		return final_resultset
 
-	def extract_keyphrases(self, to_analyse, min_size=4):
-		general_results = []
-		keywords = []
-		to_analyse = [ kw for kw in to_analyse if kw.cand_obj.size >= min_size ]
-		to_analyse = sorted(to_analyse, key=lambda x: x.cand_obj.H)
+	def evaluate_near_duplicate_headlines(self, resultset, use_headline=True, lsh=None, cluster_sizes=None):
+		'''keep the first headline of each cluster of near duplicates, found through MinHash LSH.
+		Returns the kept headlines and the cluster sizes of every headline kept by lsh, in the order they
+		were kept. Passing the lsh and cluster_sizes of a previous call extends its clusters'''
+		if lsh is None:
+			lsh = MinHashLSH(threshold=self.near_duplicate_threshold)
+		if cluster_sizes is None:
+			cluster_sizes = []
 
-		for kw in to_analyse:
-			if self.evaluate_levenshtein_distance(keywords, kw):
-				general_results.append( kw )
-				keywords.append(kw)
-
-			if len(general_results) == self.top:
-				break
+		final_resultset = []
 
-		general_results = sorted(general_results, key=lambda x: min([ t.info.datetime for t in x.headlines ]))
-		return general_results, keywords
+		for hl in resultset:
+			matches = lsh.match(len(lsh), hl.headline if use_headline else hl.title)
+			if len(matches) == 0:
+				final_resultset.append(hl)
+				cluster_sizes.append(1)
+			else:
+				cluster_sizes[min(matches)] += 1
 
-	
+		return final_resultset, cluster_sizes
 
 	def evaluate_levenshtein_distance(self, all_kw, kw):
 		'''evaluate if keyphrase is different enought from others candidates'''
 
-		for kw2 in all_kw:
-			dd = Levenshtein.ratio(kw.cand_obj.unique_kw, kw2.cand_obj.unique_kw)
-			
-			if dd > self.similarity_threshold or kw.cand_obj.unique_kw in kw2.cand_obj.unique_kw or kw2.cand_obj.unique_kw in kw.cand_obj.unique_kw:
-				return False
-
-		return True			
+		return is_distinct_keyphrase(kw.cand_obj.unique_kw, [ kw2.cand_obj.unique_kw for kw2 in all_kw ], self.similarity_threshold)
 	
 	def serialize(self, result, tls_covid=False):
-		serialized = {
+		serialized = self.serialize_header(result)
+		serialized['results'] = list(self.iter_serialized_intervals(result, tls_covid=tls_covid))
+
+		return serialized
+
+	def serialize_header(self, result):
+		'''serialized result without its intervals'''
+		return {
 			'query': result['query'],
 			'status': result['status'],
 			'domains':result['domains'],
 			'stats': result['stats'],
+			'near_duplicates': result.get('near_duplicates', {}),
 			'query_term_corr': result['query_term_corr'],
 			'news_for_timeline': result['news_for_timeline'],
 			'most_relevant_terms': result['most_relevant_terms']
 		}
 
-		serialized['results'] = []
+	def iter_serialized_intervals(self, result, tls_covid=False, max_docs=None):
+		'''serialized intervals of result, one at a time. The headline dates of each keyphrase are sorted
+		once and reused by every interval it appears in. max_docs caps the docs listed per keyphrase'''
+
+		sorted_dates = {}
 
 		for chunk in result['results']:
 			result_chunk = []
 			for result_key in chunk['keyphrases']:
 
+				if id(result_key) not in sorted_dates:
+					sorted_dates[id(result_key)] = sorted([ t.info.datetime for t in result_key.headlines ])
+				dates = sorted_dates[id(result_key)]
+
+				# first headline date inside the interval
+				first = bisect.bisect_left(dates, chunk['from'])
+				if first == len(dates) or dates[first] > chunk['to']:
+					raise ValueError('Keyphrase without headlines in its interval: ' + result_key.kw)
+
+				headlines = result_key.headlines if max_docs is None else result_key.headlines[:max_docs]
+
 				data = { 
 					'kw': result_key.cand_obj.kw,
-					'date': str(min([ t.info.datetime for t in result_key.headlines if chunk['from'] <= t.info.datetime <= chunk['to']])), 
-					'docs': [(t.info.headline, t.info.url) for t in result_key.headlines] 
+					'date': str(dates[first]), 
+					'docs': [(t.info.headline, t.info.url) for t in headlines] 
 				}
 
 				if tls_covid:
@@ -308,9 +695,32 @@ class TemporalSummarizationEngine(object):
 								'keyphrases': result_chunk 
 							  }
 
-			serialized['results'].append(result_interval)
+			yield result_interval
 
-		return serialized
+	def serialize_to(self, result, fp, tls_covid=False, max_docs=None, ndjson=False):
+		'''write the serialized result to the file-like fp one interval at a time, without building it in memory.
+		As JSON it is the same document as json.dumps(serialize(result)). As NDJSON the first line holds the
+		header and every other line one interval'''
+
+		header = self.serialize_header(result)
+		intervals = self.iter_serialized_intervals(result, tls_covid=tls_covid, max_docs=max_docs)
+
+		if ndjson:
+			fp.write(json.dumps(header))
+			fp.write('\n')
+			for interval in intervals:
+				fp.write(json.dumps(interval))
+				fp.write('\n')
+			return
+
+		fp.write('{')
+		fp.write(', '.join([ json.dumps(key) + ': ' + json.dumps(value) for key, value in header.items() ]))
+		fp.write(', "results": [')
+		for i, interval in enumerate(intervals):
+			if i > 0:
+				fp.write(', ')
+			fp.write(json.dumps(interval))
+		fp.write(']}')
 
 	def pprint(self, intervals, verbose=False):
 		
@@ -347,3 +757,111 @@ class TemporalSummarizationEngine(object):
 		
 			
 		
+
+
+class StreamingTemporalSummarizationEngine(TemporalSummarizationEngine):
+	'''Stateful summarizer for a running story that keeps receiving new headlines.
+
+	Each call to update adds the new ResultHeadLine batch to the same DataCore, refreshes the statistics
+	of the terms that batch touched and re-chunks the whole timeline, so the chunks are those build_intervals
+	would give. Every batch moves the term statistics, and so the H of every candidate: all candidates are
+	rescored in one batch and the keyphrases of every chunk are selected again.'''
+
+	def __init__(self, lan, query, use_headline=True, top_terms=20, windows_size=2, top=20, similarity_threshold=0.8, executor='process', n_jobs=None, near_duplicate_threshold=None, cooccurrence='graph', background=None):
+		TemporalSummarizationEngine.__init__(self, windows_size=windows_size, top=top, similarity_threshold=similarity_threshold, executor=executor, n_jobs=n_jobs, near_duplicate_threshold=near_duplicate_threshold, cooccurrence=cooccurrence, background=background)
+		self.lan = lan
+		self.query = query
+		self.use_headline = use_headline
+		self.top_terms = top_terms
+
+		self.dc = DataCore(windows_size=self.windows_size, stopword_set=get_stopword_set(lan), cooccurrence=self.cooccurrence, tokenization_cache=TemporalSummarizationEngine.TOKENIZATION_CACHE, background=self.background)
+		self.processed_headline = []
+		self.all_key_candidates = {}
+		self.unique_headlines = set()
+		self.domain_id = {}
+		self.result_domains = []
+		self.news_for_timeline = []
+		self.n_docs = 0
+
+		# Near duplicate clusters, kept across batches
+		self.lsh = MinHashLSH(threshold=near_duplicate_threshold) if near_duplicate_threshold is not None else None
+		self.cluster_heads = []
+		self.cluster_sizes = []
+
+		self.last_result = None
+
+	def update(self, resultset):
+		'''add a batch of ResultHeadLine and return the refreshed build_intervals style result'''
+
+		processing_time = time.time()
+		self.n_docs += len(resultset)
+
+		new_headlines = []
+		for result in sorted(resultset, key=lambda x: x.datetime):
+			text = result.headline if self.use_headline else result.title
+			if text not in self.unique_headlines:
+				self.unique_headlines.add(text)
+				new_headlines.append(result)
+
+		if self.lsh is not None:
+			new_headlines, self.cluster_sizes = self.evaluate_near_duplicate_headlines(new_headlines, use_headline=self.use_headline, lsh=self.lsh, cluster_sizes=self.cluster_sizes)
+			self.cluster_heads.extend([ hl.headline if self.use_headline else hl.title for hl in new_headlines ])
+
+		if len(new_headlines) == 0:
+			return self.last_result
+
+		new_processed = []
+		for result in new_headlines:
+			proc_head = self.add_headline(self.dc, result, self.all_key_candidates, use_headline=self.use_headline)
+
+			if proc_head.info.domain not in self.domain_id:
+				self.domain_id[proc_head.info.domain] = len(self.result_domains)
+				self.result_domains.append(proc_head.info.domain)
+
+			new_processed.append(proc_head)
+
+		if len(self.processed_headline) > 0 and new_processed[0].info.datetime < self.processed_headline[-1].info.datetime:
+			self.processed_headline = sorted(self.processed_headline + new_processed, key=lambda x: x.info.datetime)
+			self.news_for_timeline = [ (str(proc_head.info.datetime), self.domain_id[proc_head.info.domain]) for proc_head in self.processed_headline ]
+		else:
+			self.processed_headline.extend(new_processed)
+			self.news_for_timeline.extend([ (str(proc_head.info.datetime), self.domain_id[proc_head.info.domain]) for proc_head in new_processed ])
+
+		# Like build_intervals, a timeline get_chunk does not split has no intervals
+		timeline = self.processed_headline
+		chunks = []
+		if (timeline[-1].info.datetime - timeline[0].info.datetime).days > 0:
+			chunks = self.get_chunk(timeline)
+
+		terms_correlations = [ (term_obj.unique_term, 1.-term_obj.bias) for term_obj in self.dc.add_bias(self.query, updated_only=True)]
+		self.dc.build_single_terms_features(updated_only=True)
+		# The new term statistics move the H of every candidate, not only of those in the batch
+		self.dc.build_mult_terms_features()
+
+		most_relevant_terms = [Term(term=t, tf=sw.tf, h=sw.H) for t, sw in self.dc.terms.items() if not sw.stopword]
+		most_relevant_terms = heapq.nsmallest(self.top_terms, most_relevant_terms, key=lambda term: term.h)
+
+		results = self.process_chunks(chunks)
+
+		total_time_spent = time.time() - processing_time
+
+		self.last_result = {
+			'query': self.query,
+			'status': 'OK',
+			'stats': {
+				'n_unique_docs': len(self.processed_headline), 
+				'n_docs': self.n_docs, 
+				'n_domains': len(self.result_domains),
+				'n_near_duplicates': sum(self.cluster_sizes) - len(self.cluster_sizes),
+				'time': total_time_spent
+			},
+
+			'domains': list(self.result_domains),
+			'near_duplicates': { text: size for text, size in zip(self.cluster_heads, self.cluster_sizes) if size > 1 },
+			'query_term_corr': terms_correlations[:self.top*2],
+			'results': results,
+			'news_for_timeline': list(self.news_for_timeline),
+			'most_relevant_terms': most_relevant_terms
+		}
+
+		return self.last_result
@@ -0,0 +1,77 @@
+# -*- coding: utf-8 -*-
+
+from collections import defaultdict
+import string
+import zlib
+import numpy as np
+
+
+class MinHashLSH(object):
+    '''MinHash signatures of character shingles, indexed by LSH bands to find near-duplicate texts
+    without comparing every pair'''
+
+    MERSENNE_PRIME = np.uint64((1 << 61) - 1)
+    MAX_HASH = np.uint64((1 << 32) - 1)
+
+    def __init__(self, threshold=0.8, num_perm=64, shingle_size=4, seed=1):
+        self.threshold = threshold
+        self.num_perm = num_perm
+        self.shingle_size = shingle_size
+        self.bands, self.rows = MinHashLSH.optimal_bands(threshold, num_perm)
+
+        generator = np.random.RandomState(seed)
+        self.a = generator.randint(1, (1 << 32) - 1, size=num_perm, dtype=np.uint64)
+        self.b = generator.randint(0, (1 << 32) - 1, size=num_perm, dtype=np.uint64)
+
+        self.tables = [ defaultdict(list) for _ in range(self.bands) ]
+        self.shingle_sets = {}
+        self.translator = str.maketrans(string.punctuation, ' ' * len(string.punctuation))
+
+    def __len__(self):
+        return len(self.shingle_sets)
+
+    @staticmethod
+    def optimal_bands(threshold, num_perm):
+        '''(bands, rows) whose LSH threshold (1/bands)^(1/rows) is the closest to threshold'''
+        params = [ (num_perm // rows, rows) for rows in range(1, num_perm + 1) if num_perm % rows == 0 ]
+        return min(params, key=lambda p: abs((1. / p[0]) ** (1. / p[1]) - threshold))
+
+    def shingles(self, text):
+        # Case, punctuation and spacing changes should not split a cluster
+        text = ' '.join(text.lower().translate(self.translator).split())
+        if len(text) <= self.shingle_size:
+            return set([text])
+        return set([ text[i:i+self.shingle_size] for i in range(len(text) - self.shingle_size + 1) ])
+
+    def signature(self, shingle_set):
+        hashes = np.array([ zlib.crc32(shingle.encode('utf-8')) for shingle in shingle_set ], dtype=np.uint64)
+        permuted = (np.outer(self.a, hashes) + self.b[:, None]) % MinHashLSH.MERSENNE_PRIME & MinHashLSH.MAX_HASH
+        return permuted.min(axis=1)
+
+    def band_keys(self, signature):
+        return [ signature[band*self.rows:(band+1)*self.rows].tobytes() for band in range(self.bands) ]
+
+    def match(self, key, text):
+        '''keys of the inserted texts whose shingle Jaccard similarity with text is at least threshold.
+        When there is none, text is inserted under key'''
+        shingle_set = self.shingles(text)
+        band_keys = self.band_keys(self.signature(shingle_set))
+
+        candidates = set()
+        for table, band_key in zip(self.tables, band_keys):
+            candidates.update(table.get(band_key, ()))
+
+        matches = [ other for other in candidates if MinHashLSH.jaccard(shingle_set, self.shingle_sets[other]) >= self.threshold ]
+        if len(matches) == 0:
+            self.shingle_sets[key] = shingle_set
+            for table, band_key in zip(self.tables, band_keys):
+                table[band_key].append(key)
+
+        return matches
+
+    @staticmethod
+    def jaccard(x, y):
+        union_cardinality = len(x | y)
+        if union_cardinality == 0:
+            return 0.
+        return len(x & y) / float(union_cardinality)
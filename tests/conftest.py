@@ -0,0 +1,35 @@
+# -*- coding: utf-8 -*-
+import random
+from datetime import datetime, timedelta
+
+import pytest
+
+from contamehistorias.datasources.models import ResultHeadLine
+
+WORDS = ('presidente governo dilma rousseff lula silva brasil ministro senado impeachment '
+	'câmara deputados aprova destituição processo comissão especial partido oposição '
+	'milhares pessoas rua protesto contra justiça supremo tribunal juiz escutas vídeo '
+	'facebook apoio crise economia eleições votação Temer PMDB PT 2016 dia').split()
+STOP = 'de da do a o em para com que no na os as e'.split()
+
+
+def make_headlines(n, seed=1, days=600):
+	'''n synthetic portuguese headlines over about days days, a tenth of them repeated'''
+	r = random.Random(seed)
+	base = datetime(2016, 1, 1)
+	headlines = []
+	for i in range(n):
+		words = [ r.choice(STOP) if r.random() < 0.25 else r.choice(WORDS) for _ in range(r.randint(4, 12)) ]
+		if r.random() < 0.3:
+			words[0] = words[0].capitalize()
+		text = ' '.join(words)
+		if r.random() < 0.1 and headlines:
+			text = headlines[r.randrange(len(headlines))].headline
+		dt = base + timedelta(seconds=int(abs(r.gauss(0.5, 0.25)) * days * 86400) + r.randint(0, days * 86400) // 3)
+		headlines.append(ResultHeadLine(headline=text, datetime=dt, domain='d%d.pt' % r.randint(0, 9), url='http://x/%d' % i))
+	return headlines
+
+
+@pytest.fixture(scope='session')
+def headlines():
+	return make_headlines(300)
@@ -0,0 +1,34 @@
+# -*- coding: utf-8 -*-
+import json
+
+from contamehistorias.background import BackgroundStatistics
+from contamehistorias.cache import ResultCache
+from contamehistorias.datacore import get_stopword_set
+from contamehistorias.engine import TemporalSummarizationEngine
+
+from conftest import make_headlines
+
+
+def test_fingerprint_follows_the_counts():
+	stopwords = get_stopword_set('pt')
+	texts = [ hl.headline for hl in make_headlines(200, seed=2) ]
+	a = BackgroundStatistics.build(texts, stopwords)
+	b = BackgroundStatistics.build(texts, stopwords)
+	c = BackgroundStatistics.build(texts[:100], stopwords)
+	assert a.fingerprint() == b.fingerprint()
+	assert a.fingerprint() != c.fingerprint()
+
+
+def test_result_cache_keys_on_background(headlines, tmp_path):
+	background = BackgroundStatistics.build([ hl.headline for hl in make_headlines(500, seed=3) ], get_stopword_set('pt'))
+	cache = ResultCache(str(tmp_path))
+
+	plain = TemporalSummarizationEngine(executor='thread').build_serialized_intervals(headlines, 'pt', 'Dilma Rousseff', cache=cache)
+	seeded = TemporalSummarizationEngine(executor='thread', background=background).build_serialized_intervals(headlines, 'pt', 'Dilma Rousseff', cache=cache)
+	fresh = TemporalSummarizationEngine(executor='thread', background=background).build_serialized_intervals(headlines, 'pt', 'Dilma Rousseff')
+
+	assert cache.stats()['hits'] == 0
+	fresh = json.loads(json.dumps(fresh))
+	# stats holds timings
+	assert dict(seeded, stats=None) == dict(fresh, stats=None)
+	assert seeded['most_relevant_terms'] != plain['most_relevant_terms']
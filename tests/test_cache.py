@@ -0,0 +1,63 @@
+# -*- coding: utf-8 -*-
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+import pytest
+
+from contamehistorias.cache import ResultCache
+from contamehistorias.datasources.cache import ResponseCache, CacheMiss
+from contamehistorias.datasources.models import ResultHeadLine
+
+
+def test_response_cache_ttl_and_replay(tmp_path):
+	cache = ResponseCache(str(tmp_path))
+	key = ResponseCache.key('get', 'http://arquivo.pt/textsearch', {'q': 'dilma', 'maxItems': 10})
+	assert key == ResponseCache.key('GET', 'http://arquivo.pt/textsearch', {'maxItems': '10', 'q': 'dilma'})
+
+	assert cache.get(key) is None
+	cache.put(key, {'response_items': []})
+	assert cache.get(key) == {'response_items': []}
+	assert ResponseCache(str(tmp_path), ttl=-1).get(key) is None
+
+	replay = ResponseCache(str(tmp_path), mode='replay')
+	assert replay.get(key) == {'response_items': []}
+	with pytest.raises(CacheMiss):
+		replay.get(ResponseCache.key('GET', 'http://arquivo.pt/textsearch', {'q': 'lula'}))
+
+
+def test_caches_sharing_a_directory_evict_safely(tmp_path):
+	# two caches over one directory, as two processes would be, evicting each other's entries
+	caches = [ ResultCache(str(tmp_path), max_size=4096), ResultCache(str(tmp_path), max_size=4096) ]
+
+	def put(i):
+		return caches[i % 2].put('entry%d' % i, [ i ] * 200)
+
+	with ThreadPoolExecutor(max_workers=8) as executor:
+		assert list(executor.map(put, range(300))) == [ [ i ] * 200 for i in range(300) ]
+
+	assert sum([ cache.stats()['evictions'] for cache in caches ]) > 0
+
+
+def test_cache_counts_its_size(tmp_path):
+	def directory_size():
+		return sum([ size for _, size, _ in cache.entries() ])
+
+	cache = ResultCache(str(tmp_path), max_size=4096)
+	for i in range(200):
+		cache.put('entry%d' % i, list(range(i, i + 200)))
+		# overwriting an entry replaces its size
+		cache.put('entry0', [ i ] * 100)
+		assert cache.size == directory_size() <= cache.max_size
+
+	assert cache.stats()['evictions'] > 0
+	assert ResultCache(str(tmp_path), max_size=4096).size == directory_size()
+	cache.clear()
+	assert cache.size == directory_size() == 0
+
+
+def test_result_cache_key_keeps_microseconds():
+	def resultset(microsecond):
+		return [ ResultHeadLine(headline='Dilma Rousseff', datetime=datetime(2016, 5, 12, 10, 30, 0, microsecond), domain='publico.pt', url='http://x/1') ]
+
+	assert ResultCache.key(resultset(0), query='dilma') == ResultCache.key(resultset(0), query='dilma')
+	assert ResultCache.key(resultset(0), query='dilma') != ResultCache.key(resultset(500), query='dilma')
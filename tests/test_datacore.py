@@ -0,0 +1,118 @@
+# -*- coding: utf-8 -*-
+import json
+
+from contamehistorias import engine as engine_module
+from contamehistorias.datacore import DataCore, get_stopword_set
+from contamehistorias.engine import TemporalSummarizationEngine, build_datacore_shard
+
+from conftest import make_headlines
+
+
+def texts(n, seed=6):
+	return [ hl.headline for hl in make_headlines(n, seed=seed) ]
+
+
+def build(texts, cooccurrence='graph'):
+	dc = DataCore(get_stopword_set('pt'), 2, cooccurrence=cooccurrence)
+	for text in texts:
+		dc.add_document(text)
+	return dc
+
+
+def summary(dc, query='dilma rousseff'):
+	'''every feature of the terms and candidates of dc, as a string so NaN compare equal'''
+	dc.add_bias(query)
+	dc.build_single_terms_features()
+	dc.build_mult_terms_features()
+	terms = [ (key, t.tf, t.H, t.bias, t.WPos, t.WRel, t.WFreq, t.WCase, t.WSpread) for key, t in dc.terms.items() ]
+	candidates = [ (key, c.kw, c.tf, c.H, sorted(c.tags)) for key, c in dc.candidates.items() ]
+	return json.dumps([ terms, candidates, dc.number_of_words, dc.number_of_sentences, dc.number_of_documents ])
+
+
+def test_sparse_backend_matches_graph():
+	corpus = texts(800)
+	assert summary(build(corpus, 'sparse')) == summary(build(corpus, 'graph'))
+
+
+def test_sparse_backend_gives_the_same_timeline(headlines):
+	results = []
+	for cooccurrence in ('graph', 'sparse'):
+		result = TemporalSummarizationEngine(executor='serial', cooccurrence=cooccurrence).build_serialized_intervals(headlines, 'pt', 'Dilma Rousseff')
+		result['stats'].pop('time')
+		results.append(json.dumps(result, default=str))
+	assert results[0] == results[1]
+
+
+def test_score_candidates_matches_update_h():
+	for cooccurrence in ('graph', 'sparse'):
+		dc = build(texts(800, seed=7), cooccurrence)
+		dc.build_single_terms_features()
+		for features in (None, ['WRel'], ['WFreq', 'WCase']):
+			scores = []
+			for engine in ('python', 'numpy'):
+				for c in dc.candidates.values():
+					c.H = None
+				dc.build_mult_terms_features(features=features, engine=engine)
+				scores.append(json.dumps([ (c.H, c.tf) for c in dc.candidates.values() ]))
+			assert scores[0] == scores[1], (cooccurrence, features)
+
+
+def test_add_bias_numpy_matches_python():
+	for cooccurrence in ('graph', 'sparse'):
+		dc = build(texts(800, seed=8), cooccurrence)
+		for query in ('dilma rousseff', 'Governo', 'Temer e o impeachment no senado', 'lula desconhecido', 'de da'):
+			biases = []
+			for engine in ('python', 'numpy'):
+				for t in dc.terms.values():
+					t.bias = None
+				dc.add_bias(query, engine=engine)
+				biases.append(json.dumps([ (key, t.bias) for key, t in dc.terms.items() if not t.stopword ]))
+			assert biases[0] == biases[1], (cooccurrence, query)
+
+
+def test_merge_matches_serial_ingestion():
+	corpus = texts(900, seed=8)
+	for cooccurrence in ('graph', 'sparse'):
+		merged = DataCore(get_stopword_set('pt'), 2, cooccurrence=cooccurrence)
+		for start in range(0, len(corpus), 300):
+			shard_dc, _ = build_datacore_shard(corpus[start:start + 300], get_stopword_set('pt'), 2, cooccurrence)
+			merged.merge(shard_dc)
+		assert summary(merged) == summary(build(corpus, cooccurrence))
+
+
+def test_sharded_engine_gives_the_same_timeline(monkeypatch):
+	monkeypatch.setattr(TemporalSummarizationEngine, 'MIN_PARALLEL_INGEST_DOCS', 1000)
+	headlines = make_headlines(2400, seed=9)
+	results = []
+	for executor, n_jobs in (('serial', 1), ('pool', 3)):
+		with TemporalSummarizationEngine(executor=executor, n_jobs=n_jobs) as engine:
+			result = engine.build_serialized_intervals(headlines, 'pt', 'Dilma Rousseff')
+		result['stats'].pop('time')
+		results.append(json.dumps(result, default=str))
+	assert results[0] == results[1]
+
+
+def test_thread_engine_ingests_serially(monkeypatch):
+	def build_datacore_shard(*args):
+		raise AssertionError('thread executors must not shard ingestion')
+	monkeypatch.setattr(engine_module, 'build_datacore_shard', build_datacore_shard)
+	monkeypatch.setattr(TemporalSummarizationEngine, 'MIN_PARALLEL_INGEST_DOCS', 1000)
+
+	result = TemporalSummarizationEngine(executor='thread', n_jobs=3).build_intervals(make_headlines(2400, seed=9), 'pt', 'Dilma Rousseff')
+	assert len(result['results']) > 0
+
+
+def test_save_load_round_trip(tmp_path):
+	corpus = texts(900, seed=10)
+	for cooccurrence in ('graph', 'sparse'):
+		path = str(tmp_path / ('dc_%s.npz' % cooccurrence))
+		dc = build(corpus[:600], cooccurrence)
+		dc.save(path)
+		loaded = DataCore.load(path)
+		assert loaded.cooccurrence == dc.cooccurrence
+
+		# documents added after loading extend it like the original
+		for text in corpus[600:]:
+			dc.add_document(text)
+			loaded.add_document(text)
+		assert summary(loaded) == summary(dc)
@@ -0,0 +1,40 @@
+# -*- coding: utf-8 -*-
+import random
+from collections import namedtuple
+from datetime import datetime, timedelta
+
+from contamehistorias.engine import TemporalSummarizationEngine, ProcessedHeadline
+
+Info = namedtuple('Info', ['datetime'])
+
+
+def timeline(times):
+	return [ ProcessedHeadline(info=Info(datetime=t), candidates=[], terms={}) for t in sorted(times) ]
+
+
+def assert_engines_agree(resultset):
+	engine = TemporalSummarizationEngine()
+	for order in (1, 2, 3):
+		chunks = engine.get_chunk(resultset, order=order, engine='python')
+		assert engine.get_chunk(resultset, order=order, engine='numpy') == chunks, (len(resultset), order)
+
+
+def test_get_chunk_engines_agree_on_random_spans():
+	r = random.Random(3)
+	start = datetime(2016, 1, 1)
+	for days in (1, 2, 7, 59, 60, 61, 365, 720):
+		for n in (2, 50, 800):
+			# bursts of news over a flat background, down to the microsecond
+			bursts = [ r.uniform(0, days) for _ in range(4) ]
+			offsets = [ r.gauss(r.choice(bursts), days / 30.) if r.random() < 0.7 else r.uniform(0, days) for _ in range(n) ]
+			times = [ start + timedelta(days=min(max(offset, 0), days)) for offset in offsets ] + [ start, start + timedelta(days=days) ]
+			assert_engines_agree(timeline(times))
+
+
+def test_get_chunk_engines_agree_on_day_boundaries():
+	r = random.Random(4)
+	start = datetime(2016, 1, 1)
+	for days in (1, 3, 60, 120, 600):
+		# every document published at midnight, many at the same instant and on the interval edges
+		times = [ start + timedelta(days=r.randint(0, days)) for _ in range(500) ] + [ start, start + timedelta(days=days) ]
+		assert_engines_agree(timeline(times))
@@ -0,0 +1,94 @@
+# -*- coding: utf-8 -*-
+from datetime import datetime
+import http.server
+import json
+import threading
+
+import pytest
+
+from contamehistorias.datasources.http import HttpClient
+from contamehistorias.datasources.webarchive import ArquivoPT
+
+
+class Handler(http.server.BaseHTTPRequestHandler):
+	'''answers /fail-N with 503 on its first N requests, then with an empty textsearch page'''
+	protocol_version = 'HTTP/1.1'
+	seen = {}
+
+	def do_GET(self):
+		path = self.path.split('?')[0]
+		Handler.seen[path] = Handler.seen.get(path, 0) + 1
+		failing = path.startswith('/fail-') and Handler.seen[path] <= int(path.split('-')[1])
+		body = b'' if failing else json.dumps({'response_items': []}).encode('utf-8')
+		self.send_response(503 if failing else 200)
+		self.send_header('Content-Length', str(len(body)))
+		self.send_header('Retry-After', '0')
+		self.end_headers()
+		self.wfile.write(body)
+
+	def log_message(self, *args):
+		pass
+
+
+@pytest.fixture
+def server():
+	Handler.seen = {}
+	httpd = http.server.ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+	thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+	thread.start()
+	yield 'http://127.0.0.1:%d' % httpd.server_address[1]
+	httpd.shutdown()
+	httpd.server_close()
+
+
+def test_throttled_requests_are_retried(server):
+	with HttpClient(max_retries=3) as client:
+		response = client.get(server + '/fail-2')
+		assert response.status_code == 200 and response.attempts == 3
+
+		response = client.get(server + '/fail-9')
+		assert response.status_code == 503 and response.attempts == 4
+
+		stats = client.stats()
+		assert stats['retries'] == 5 and stats['server_errors'] == 6 and stats['failures'] == 1
+
+
+def test_arquivopt_reports_lost_domains(server, monkeypatch, capsys):
+	interval = (datetime(2016, 1, 1).strftime(ArquivoPT.DATETIME_FORMAT), datetime(2017, 1, 1).strftime(ArquivoPT.DATETIME_FORMAT))
+	apt = ArquivoPT(max_retries=1)
+
+	monkeypatch.setattr(ArquivoPT, 'URL_REQUEST', server + '/fail-1')
+	assert apt.getPage(['http://publico.pt/'], 'dilma', interval) == {'response_items': []}
+
+	monkeypatch.setattr(ArquivoPT, 'URL_REQUEST', server + '/fail-9')
+	assert apt.getPage(['http://publico.pt/'], 'dilma', interval) is None
+	assert 'after 2 attempt(s): HTTP 503' in capsys.readouterr().out
+
+	# not retried: the request can not be sent at all
+	monkeypatch.setattr(ArquivoPT, 'URL_REQUEST', 'http://')
+	assert apt.getPage(['http://publico.pt/'], 'dilma', interval) is None
+	assert 'after 1 attempt(s)' in capsys.readouterr().out
+
+
+def test_arquivopt_stream_stops_paging(monkeypatch):
+	# results come from www.publico.pt while publico.pt was requested, and every page offers a next one
+	pages = []
+
+	def getPage(domains, query, interval, offset=0):
+		pages.append(offset)
+		items = [ {'originalURL': 'http://www.publico.pt/%d' % (offset + i), 'title': 'Dilma Rousseff %d' % (offset + i),
+			'tstamp': '20160601000000', 'linkToArchive': 'http://arquivo.pt/%d' % ((offset + i) % 25)} for i in range(10) ]
+		return {'response_items': items, 'next_page': True}
+
+	apt = ArquivoPT(max_items_per_site=40)
+	monkeypatch.setattr(apt, 'getPage', getPage)
+	results = list(apt.stream_results('dilma', domains=['http://publico.pt/'], **{'from': datetime(2016, 1, 1), 'to': datetime(2017, 1, 1)}))
+	# links repeat after 25 results, so the fourth page brings nothing new
+	assert len(results) == 25
+	assert pages == [0, 10, 20, 30]
+
+	pages.clear()
+	apt.max_items_per_site = 15
+	results = list(apt.stream_results('dilma', domains=['http://publico.pt/'], **{'from': datetime(2016, 1, 1), 'to': datetime(2017, 1, 1)}))
+	assert len(results) == 15
+	assert pages == [0, 10]
@@ -0,0 +1,70 @@
+# -*- coding: utf-8 -*-
+import random
+
+from contamehistorias.engine import KeyphraseIndex, TemporalSummarizationEngine, is_distinct_keyphrase
+
+from conftest import make_headlines
+
+WORDS = 'dilma rousseff lula presidente impeachment senado governo crise brasil temer eleições ção'.split()
+
+
+def random_keyphrases(n, seed):
+	r = random.Random(seed)
+	kws = []
+	for _ in range(n):
+		kw = ' '.join([ r.choice(WORDS) for _ in range(r.randint(1, 3)) ])
+		if r.random() < 0.3:
+			# small edits of the same keyphrase, the near misses of the threshold
+			i = r.randrange(len(kw))
+			kw = kw[:i] + r.choice('aeiosx') + kw[i+1:]
+		kws.append(kw)
+	return kws
+
+
+def test_is_distinct_matches_pairwise_scan():
+	kws = random_keyphrases(400, seed=1)
+	for threshold in [ i / 10. for i in range(11) ]:
+		index = KeyphraseIndex(threshold)
+		accepted = []
+		for kw in kws:
+			expected = is_distinct_keyphrase(kw, accepted, threshold)
+			assert index.is_distinct(kw) == expected, (kw, threshold)
+			if expected:
+				index.add(kw)
+				accepted.append(kw)
+
+
+def per_chunk_keyphrases(chunk, top, similarity_threshold, min_size=4):
+	'''keyphrases of a chunk as the engine selected them before ChunkPayload, one chunk at a time'''
+	kws = set()
+	seen = set()
+	to_analyse = []
+	for doc_proc in chunk:
+		for kw in sorted(doc_proc.candidates, key=lambda x: x.cand_obj.H):
+			if kw.kw not in kws:
+				kws.add(kw.kw)
+				if doc_proc.info not in seen:
+					seen.add(doc_proc.info)
+					to_analyse.append(kw)
+
+	selected = []
+	for kw in sorted([ kw for kw in to_analyse if kw.cand_obj.size >= min_size ], key=lambda x: x.cand_obj.H):
+		if is_distinct_keyphrase(kw.kw, [ kw2.kw for kw2 in selected ], similarity_threshold):
+			selected.append(kw)
+		if len(selected) == top:
+			break
+	return sorted(selected, key=lambda x: min([ t.info.datetime for t in x.headlines ]))
+
+
+def test_process_chunks_matches_per_chunk_selection():
+	for top, similarity_threshold in ((20, 0.8), (5, 0.5)):
+		engine = TemporalSummarizationEngine(top=top, similarity_threshold=similarity_threshold, executor='serial')
+		chunks = []
+		process_chunks = engine.process_chunks
+		engine.process_chunks = lambda chunk_list: chunks.extend(chunk_list) or process_chunks(chunk_list)
+
+		result = engine.build_intervals(make_headlines(400, seed=2), 'pt', 'Dilma Rousseff')
+		assert len(chunks) > 1
+		for chunk, interval in zip(chunks, result['results']):
+			assert interval['keyphrases'] == per_chunk_keyphrases(chunk, top, similarity_threshold)
+			assert engine.proc_chunk(chunk)['keyphrases'] == interval['keyphrases']
@@ -0,0 +1,38 @@
+# -*- coding: utf-8 -*-
+import random
+
+from contamehistorias.Levenshtein import Levenshtein
+
+
+def random_strings(n, seed, alphabet='abcde ', max_length=80):
+	r = random.Random(seed)
+	return [ ''.join([ r.choice(alphabet) for _ in range(r.randint(0, max_length)) ]) for _ in range(n) ]
+
+
+def test_distance_matches_matrix():
+	# lengths beyond 64 exercise the multi-word bit masks
+	strings = random_strings(120, seed=1) + ['', 'a', 'ção', 'coração partido']
+	for seq1, seq2 in zip(strings, reversed(strings)):
+		assert Levenshtein.distance(seq1, seq2) == Levenshtein.distance_matrix(seq1, seq2)
+
+
+def test_distance_of_unhashable_items():
+	seq1, seq2 = [['a'], ['b'], ['c']], [['a'], ['c']]
+	assert Levenshtein.distance(seq1, seq2) == Levenshtein.distance_matrix(seq1, seq2) == 1.
+
+
+def test_ratio_many_matches_ratio():
+	strings = random_strings(60, seed=2, max_length=30)
+	for seq in strings[:10]:
+		candidates = [ cand for cand in strings if len(cand) + len(seq) > 0 ]
+		assert Levenshtein.ratio_many(seq, candidates) == [ 1 - Levenshtein.distance_matrix(seq, cand) / float(max(len(seq), len(cand))) for cand in candidates ]
+
+
+def test_bounded_distance():
+	r = random.Random(3)
+	strings = random_strings(80, seed=3, max_length=40)
+	for seq1, seq2 in zip(strings, strings[1:]):
+		exact = Levenshtein.distance_matrix(seq1, seq2)
+		max_distance = r.randint(0, 40)
+		expected = exact if exact <= max_distance else None
+		assert Levenshtein.bounded_distance(seq1, seq2, max_distance) == expected
@@ -0,0 +1,52 @@
+# -*- coding: utf-8 -*-
+from contamehistorias.engine import TemporalSummarizationEngine, StreamingTemporalSummarizationEngine
+
+from conftest import make_headlines
+
+
+def boundaries(result):
+	return [ (interval['from'], interval['to'], interval['n_docs']) for interval in result['results'] ]
+
+
+def keyphrases(result):
+	return [ [ kw.kw for kw in interval['keyphrases'] ] for interval in result['results'] ]
+
+
+def test_streaming_chunks_match_build_intervals():
+	headlines = sorted(make_headlines(3000, seed=4), key=lambda hl: hl.datetime)
+	query = 'Dilma Rousseff'
+
+	stream = StreamingTemporalSummarizationEngine('pt', query, executor='thread')
+	for start in range(0, len(headlines), 300):
+		streamed = stream.update(headlines[start:start + 300])
+
+		expected = TemporalSummarizationEngine(executor='thread').build_intervals(headlines[:start + 300], 'pt', query)
+		assert boundaries(streamed) == boundaries(expected)
+		assert keyphrases(streamed) == keyphrases(expected)
+
+	assert len(streamed['results']) > 1
+	assert streamed['news_for_timeline'] == expected['news_for_timeline']
+
+
+def test_streaming_rescores_unchanged_chunks():
+	# The tail batch leaves the earlier chunks as they were but moves the statistics every H depends on
+	headlines = sorted(make_headlines(400, seed=5), key=lambda hl: hl.datetime)
+	query = 'Dilma Rousseff'
+
+	stream = StreamingTemporalSummarizationEngine('pt', query, executor='thread')
+	stream.update(headlines[:300])
+	streamed = stream.update(headlines[300:])
+
+	expected = TemporalSummarizationEngine(executor='thread').build_intervals(headlines, 'pt', query)
+	assert boundaries(streamed) == boundaries(expected)
+	assert keyphrases(streamed) == keyphrases(expected)
+
+
+def test_streaming_without_chunks_has_no_intervals():
+	headlines = sorted(make_headlines(40), key=lambda hl: hl.datetime)
+	query = 'Dilma Rousseff'
+
+	expected = TemporalSummarizationEngine().build_intervals(headlines, 'pt', query)
+	streamed = StreamingTemporalSummarizationEngine('pt', query).update(headlines)
+	assert expected['results'] == []
+	assert streamed['results'] == []
@@ -0,0 +1,27 @@
+# -*- coding: utf-8 -*-
+from concurrent.futures import ThreadPoolExecutor
+import sys
+
+from contamehistorias.datacore import TokenizationCache
+
+from conftest import make_headlines
+
+
+def test_shared_cache_under_threads():
+	texts = [ hl.headline + '. ' + hl.headline.upper() for hl in make_headlines(400, seed=5) ]
+	expected = [ TokenizationCache().tokenize(text) for text in texts ]
+
+	# a small cache keeps evicting the keys other threads are reading
+	cache = TokenizationCache(max_size=8)
+	switch_interval = sys.getswitchinterval()
+	sys.setswitchinterval(1e-6)
+	try:
+		with ThreadPoolExecutor(max_workers=8) as executor:
+			for _ in range(5):
+				assert list(executor.map(cache.tokenize, texts)) == expected
+	finally:
+		sys.setswitchinterval(switch_interval)
+
+	stats = cache.stats()
+	assert stats['hits'] + stats['misses'] == 5 * len(texts)
+	assert stats['size'] <= 8 and stats['sentence_size'] <= 8